@@ -0,0 +1,104 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+
+class TaskAdmission:
+    """
+    Counts the tasks accepted by POST /compute that are not processed yet, whether they wait in the queue of
+    the tasks service or are being processed. New tasks are rejected once capacity tasks are admitted.
+    Each admitted task holds a lease, released when the service is done processing it. A lease stops counting
+    after lease_seconds in case its task never reaches the service, e.g. when its input can't be downloaded,
+    but stays in line so that the task still releases its own lease if it is processed later.
+    """
+
+    def __init__(self, capacity, lease_seconds=3600):
+        """
+        Args:
+            capacity: number of tasks admitted at most
+            lease_seconds: time after which an admitted task that was not released no longer counts
+        """
+        self.capacity = capacity
+        self.lease_seconds = lease_seconds
+        # Lease of every task admitted and not released, by token, in admission order
+        self._leases = OrderedDict()
+        self._tokens = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _live(self):
+        """Number of leases that did not expire, forgetting the ones expired twice over"""
+        now = time.monotonic()
+        while self._leases and next(iter(self._leases.values())) <= now - 2 * self.lease_seconds:
+            self._leases.popitem(last=False)
+        return sum(1 for admitted_at in self._leases.values() if admitted_at > now - self.lease_seconds)
+
+    @property
+    def admitted(self):
+        """Number of tasks admitted and not released"""
+        with self._lock:
+            return self._live()
+
+    @property
+    def saturated(self):
+        return self.admitted >= self.capacity
+
+    def try_admit(self):
+        """Admits a task, returns the token of its lease, None when capacity tasks are already admitted"""
+        with self._lock:
+            if self._live() >= self.capacity:
+                return None
+            token = next(self._tokens)
+            self._leases[token] = time.monotonic()
+            return token
+
+    def release(self, token=None):
+        """
+        Releases the lease of a task
+        Args:
+            token: token returned by try_admit, None for the oldest lease. The tasks service processes the
+                   tasks in the order they were posted, the task it is done with holds the oldest lease
+        """
+        with self._lock:
+            if token is not None:
+                self._leases.pop(token, None)
+            elif self._leases:
+                self._leases.popitem(last=False)
+
+
+def install_admission(app, admission_of, on_reject=None, path="/compute"):
+    """
+    Admits the tasks posted to the app before they are queued, answering 503 with a Retry-After header
+    when the admission is saturated
+    Args:
+        app: FastAPI application
+        admission_of: function returning the TaskAdmission, None while the service is not started
+        on_reject: optional function called for every rejected task
+        path: path the tasks are posted to
+    """
+
+    @app.middleware("http")
+    async def admit_tasks(request: Request, call_next):
+        admission = admission_of() if request.method == "POST" and request.url.path == path else None
+        if admission is None:
+            return await call_next(request)
+        token = admission.try_admit()
+        if token is None:
+            if on_reject is not None:
+                on_reject()
+            return JSONResponse(
+                status_code=503,
+                content={"detail": "The service is busy, retry later"},
+                headers={"Retry-After": "5"},
+            )
+        try:
+            response = await call_next(request)
+        except BaseException:
+            admission.release(token)
+            raise
+        # Tasks refused by the tasks service are never processed
+        if response.status_code >= 400:
+            admission.release(token)
+        return response
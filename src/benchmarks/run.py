@@ -0,0 +1,202 @@
+"""
+Benchmarks the correction pipeline on synthetic scanned PDFs.
+
+Run from the src directory, e.g.:
+    python -m benchmarks.run --pages 50 --dpi 300 --analysis-dpi 150
+"""
+import argparse
+import json
+import resource
+import sys
+import time
+import numpy as np
+
+from benchmarks.synthetic import generate_pdf, random_specs
+from interfaces.pdffileloader import DECODE_POLICIES
+from models.memorybudget import MemoryBudget
+from models.pdffile import PDFFile
+from models.stagetimer import StageTimer
+from services.cascadeorientationpredictor import CascadeOrientationPredictor
+from services.cv2skewpredictor import CV2SkewPredictor
+from services.outputprofile import OutputProfile
+from services.pdf_corrector import PDFCorrector
+from services.pdfiumloader import PDFiumLoader
+from services.pdfplumberloader import PDFPlumberLoader
+from services.projectionorientationpredictor import ProjectionOrientationPredictor
+from services.projectionskewpredictor import ProjectionSkewPredictor
+from services.tesseractorientationpredictor import TesseractOrientationPredictor
+from services.tiledorientationpredictor import TiledOrientationPredictor
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def orientation_predictor(args):
+    if args.orientation_engine == "tesserocr":
+        from services.tesserocrorientationpredictor import TesserocrOrientationPredictor
+        predictor = TesserocrOrientationPredictor(pool_size=args.tesseract_pool_size, analysis_dpi=args.analysis_dpi)
+    elif args.orientation_engine == "projection":
+        predictor = ProjectionOrientationPredictor(analysis_dpi=args.analysis_dpi)
+    else:
+        predictor = TesseractOrientationPredictor(analysis_dpi=args.analysis_dpi)
+    if args.orientation_tiles > 1:
+        predictor = TiledOrientationPredictor(predictor, max_tiles=args.orientation_tiles,
+                                              tile_size=args.orientation_tile_size)
+    if args.orientation_cascade is not None and args.orientation_engine != "projection":
+        return CascadeOrientationPredictor(ProjectionOrientationPredictor(analysis_dpi=args.analysis_dpi), predictor,
+                                           threshold=args.orientation_cascade)
+    return predictor
+
+
+def angle_errors(pdf, specs, with_orientation=True):
+    orientation_hits = []
+    skew_errors = []
+    for page, (orientation, skew_angle) in zip(pdf.pages, specs):
+        image = page.images[0]
+        orientation_hits.append(image.orientation == orientation)
+        skew_errors.append(abs(float(image.skew_angle) - skew_angle))
+    skew_errors = np.array(skew_errors)
+    errors = {
+        "skew_error_mean": float(skew_errors.mean()),
+        "skew_error_median": float(np.median(skew_errors)),
+        "skew_error_p95": float(np.percentile(skew_errors, 95)),
+        "skew_error_max": float(skew_errors.max()),
+    }
+    if with_orientation:
+        errors["orientation_accuracy"] = float(np.mean(orientation_hits))
+    return errors
+
+
+def run_service(pdf_data):
+    # Imported here as the service needs the common code and its settings
+    from common_code.common.enums import FieldDescriptionType
+    from common_code.tasks.models import TaskData
+    from main import MyService
+
+    service = MyService()
+    try:
+        return service.process({"PDF": TaskData(data=pdf_data, type=FieldDescriptionType.APPLICATION_PDF)})
+    finally:
+        service.shutdown()
+
+
+def run(args):
+    specs = random_specs(args.pages, orientations=args.orientations, max_skew=args.max_skew, seed=args.seed)
+    pdf_data, generation_time = timed(generate_pdf, specs, dpi=args.dpi, seed=args.seed)
+    report = {
+        "pages": args.pages,
+        "dpi": args.dpi,
+        "input_bytes": len(pdf_data),
+        "generation_seconds": generation_time,
+        "stages": {},
+    }
+
+    def stage(name, seconds):
+        report["stages"][name] = {
+            "seconds": seconds,
+            "pages_per_second": args.pages / seconds if seconds > 0 else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    loader_class = PDFiumLoader if args.loader == "pdfium" else PDFPlumberLoader
+    budget = MemoryBudget(args.memory_budget * 2 ** 20) if args.memory_budget else None
+    loader = loader_class(decode_policy=args.decode_policy, budget=budget)
+    pdf, seconds = timed(PDFFile.ofBytes, pdf_data, loader)
+    stage("load", seconds)
+
+    if args.skew_engine == "projection":
+        skew_predictor = ProjectionSkewPredictor(analysis_dpi=args.analysis_dpi)
+    else:
+        skew_predictor = CV2SkewPredictor(analysis_dpi=args.analysis_dpi, length_weighted=args.length_weighted)
+    if args.skip_orientation:
+        _, seconds = timed(pdf.predict_skew, skew_predictor)
+        stage("skew", seconds)
+    else:
+        # Single pass sharing the preprocessing, timed per predictor
+        timer = StageTimer()
+        pdf.predict(orientation_predictor(args), skew_predictor, timer=timer,
+                    orientation_samples=args.orientation_samples, sample_confidence=args.sample_confidence)
+        stage("orientation", timer.durations["orientation"])
+        stage("skew", timer.durations["skew"])
+
+    corrector = PDFCorrector(rotate_pages=args.rotate_pages, vector_skew=args.vector_skew, engine=args.engine,
+                             lossless_jpeg=args.lossless_jpeg, pass_through=args.pass_through,
+                             output_profile=OutputProfile.named(args.output_profile) if args.output_profile else None)
+    corrected_pdf, seconds = timed(pdf.to_corrected_pdf, corrector)
+    stage("correction", seconds)
+    report["output_bytes"] = len(corrected_pdf.getvalue())
+    report["accuracy"] = angle_errors(pdf, specs, not args.skip_orientation)
+    del pdf, corrected_pdf
+
+    if args.service:
+        _, seconds = timed(run_service, pdf_data)
+        stage("service", seconds)
+
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def print_report(report):
+    print(f"{report['pages']} pages at {report['dpi']} dpi, "
+          f"{report['input_bytes'] / 1e6:.1f} MB in, {report['output_bytes'] / 1e6:.1f} MB out")
+    print(f"{'stage':<12}{'seconds':>10}{'pages/s':>10}{'peak RSS (MB)':>16}")
+    for name, values in report["stages"].items():
+        pages_per_second = values["pages_per_second"] or float("nan")
+        print(f"{name:<12}{values['seconds']:>10.3f}{pages_per_second:>10.2f}{values['peak_rss_mb']:>16.1f}")
+    for name, value in report["accuracy"].items():
+        print(f"{name:<22}{value:.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the correction pipeline on synthetic scanned PDFs")
+    parser.add_argument("--pages", type=int, default=20, help="number of pages of the document")
+    parser.add_argument("--dpi", type=int, default=300, help="resolution of the scans")
+    parser.add_argument("--orientations", type=int, nargs="+", choices=[0, 90, 180, 270], default=[0, 90, 180, 270],
+                        help="orientations the pages are drawn from")
+    parser.add_argument("--max-skew", type=float, default=5.0, help="maximum absolute skew angle, in degrees")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--loader", choices=["pdfplumber", "pdfium"], default="pdfplumber")
+    parser.add_argument("--decode-policy", choices=DECODE_POLICIES, default="eager")
+    parser.add_argument("--memory-budget", type=int, default=0, metavar="MB",
+                        help="megabytes of decoded images held in memory, the others are spilled to disk")
+    parser.add_argument("--orientation-engine", choices=["tesseract", "tesserocr", "projection"], default="tesseract")
+    parser.add_argument("--orientation-cascade", type=float, metavar="THRESHOLD",
+                        help="decide confident orientations from projection profiles before the orientation engine")
+    parser.add_argument("--orientation-tiles", type=int, default=1,
+                        help="run the orientation engine on this many text dense tiles and vote, 1 for the whole image")
+    parser.add_argument("--orientation-tile-size", type=int, default=1000)
+    parser.add_argument("--orientation-samples", type=int, default=0,
+                        help="number of pages the orientation is sampled on before applying it to the others")
+    parser.add_argument("--sample-confidence", type=float, default=2.0)
+    parser.add_argument("--tesseract-pool-size", type=int, default=2)
+    parser.add_argument("--skip-orientation", action="store_true", help="do not run the orientation stage")
+    parser.add_argument("--analysis-dpi", type=int, default=None)
+    parser.add_argument("--skew-engine", choices=["hough", "projection"], default="hough")
+    parser.add_argument("--length-weighted", action="store_true", help="weight the skew angles by segment length")
+    parser.add_argument("--engine", choices=PDFCorrector.ENGINES, default="reportlab")
+    parser.add_argument("--rotate-pages", action="store_true")
+    parser.add_argument("--pass-through", action="store_true", help="copy the pages that need no correction")
+    parser.add_argument("--vector-skew", action="store_true")
+    parser.add_argument("--lossless-jpeg", action="store_true")
+    parser.add_argument("--output-profile", choices=tuple(OutputProfile.PROFILES))
+    parser.add_argument("--service", action="store_true", help="also time MyService.process end to end")
+    parser.add_argument("--json", help="file to write the report to, as JSON")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
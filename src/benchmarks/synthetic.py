@@ -0,0 +1,114 @@
+import cv2
+import numpy as np
+from io import BytesIO
+from PyPDF2 import PageObject, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject, NumberObject
+
+A4_INCHES = (8.27, 11.69)
+
+# Rotations turning an upright page into a page the predictors should report with the given orientation
+ORIENTATION_ROTATIONS = {
+    90: cv2.ROTATE_90_CLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_COUNTERCLOCKWISE,
+}
+
+
+def random_specs(page_count, orientations=(0, 90, 180, 270), max_skew=5.0, seed=0):
+    """
+    Returns page_count (orientation, skew_angle) pairs drawn at random
+    Args:
+        page_count: number of pages
+        orientations: orientations to draw from
+        max_skew: maximum absolute skew angle, in degrees
+        seed: seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+    return [
+        (int(rng.choice(orientations)), float(rng.uniform(-max_skew, max_skew)))
+        for _ in range(page_count)
+    ]
+
+
+def make_page(orientation=0, skew_angle=0.0, dpi=300, page_size=A4_INCHES, seed=0):
+    """
+    Renders a scanned-like text page as a BGR image
+    Args:
+        orientation: orientation the predictors should report (0, 90, 180 or 270)
+        skew_angle: skew angle the predictors should report, in degrees
+        dpi: resolution of the scan
+        page_size: (width, height) of the page in inches
+        seed: seed of the random text
+    """
+    rng = np.random.default_rng(seed)
+    width, height = int(page_size[0] * dpi), int(page_size[1] * dpi)
+    img = np.full((height, width, 3), 255, dtype=np.uint8)
+
+    scale = dpi / 300
+    margin = int(0.8 * dpi)
+    line_height = int(70 * scale)
+    y = margin
+    while y < height - margin:
+        words = ["".join(chr(97 + c) for c in rng.integers(0, 26, rng.integers(2, 10))) for _ in range(9)]
+        cv2.putText(img, " ".join(words).capitalize(), (margin, y), cv2.FONT_HERSHEY_SIMPLEX,
+                    1.4 * scale, (20, 20, 20), max(1, int(3 * scale)), cv2.LINE_AA)
+        y += line_height
+
+    # Scanner noise
+    noise = rng.normal(0, 6, img.shape[:2]).astype(np.int16)
+    img = np.clip(img.astype(np.int16) + noise[:, :, None], 0, 255).astype(np.uint8)
+
+    if skew_angle:
+        # The correction rotates by +skew_angle, the scan is rotated the other way
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), -skew_angle, 1.0)
+        img = cv2.warpAffine(img, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                             borderMode=cv2.BORDER_CONSTANT, borderValue=(255, 255, 255))
+    if orientation in ORIENTATION_ROTATIONS:
+        img = cv2.rotate(img, ORIENTATION_ROTATIONS[orientation])
+    return img
+
+
+def generate_pdf(specs, dpi=300, page_size=A4_INCHES, jpeg_quality=85, seed=0):
+    """
+    Generates a scanned PDF with one JPEG image per page
+    Args:
+        specs: list of (orientation, skew_angle) pairs, one per page
+        dpi: resolution of the scans
+        page_size: (width, height) of the pages in inches
+        jpeg_quality: quality of the embedded JPEG images
+        seed: seed of the random text
+    Returns:
+        bytes of the PDF
+    """
+    pdf_writer = PdfWriter()
+    for index, (orientation, skew_angle) in enumerate(specs):
+        img = make_page(orientation, skew_angle, dpi, page_size, seed + index)
+        ok, jpeg = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+        img_height, img_width = img.shape[:2]
+
+        image_stream = DecodedStreamObject()
+        image_stream.set_data(jpeg.tobytes())
+        image_stream.update({
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Image"),
+            NameObject("/Width"): NumberObject(img_width),
+            NameObject("/Height"): NumberObject(img_height),
+            NameObject("/ColorSpace"): NameObject("/DeviceRGB"),
+            NameObject("/BitsPerComponent"): NumberObject(8),
+            NameObject("/Filter"): NameObject("/DCTDecode"),
+        })
+        page_width, page_height = img_width * 72 / dpi, img_height * 72 / dpi
+        content_stream = DecodedStreamObject()
+        content_stream.set_data(f"q {page_width:.4f} 0 0 {page_height:.4f} 0 0 cm /Im0 Do Q".encode())
+
+        page = pdf_writer.add_page(PageObject.create_blank_page(None, page_width, page_height))
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/XObject"): DictionaryObject({
+                NameObject("/Im0"): pdf_writer._add_object(image_stream),
+            }),
+        })
+        page[NameObject("/Contents")] = pdf_writer._add_object(content_stream)
+
+    output = BytesIO()
+    pdf_writer.write(output)
+    return output.getvalue()
@@ -0,0 +1,96 @@
+from functools import lru_cache
+from typing import Literal
+from pydantic import Field, model_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class CorrectionSettings(BaseSettings):
+    """
+    Settings specific to the orientation correction, read from the environment
+    """
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    # How images are read from the document: "pdfplumber" or "pdfium" (no layout analysis, decodes every scan filter)
+    loader_engine: Literal["pdfplumber", "pdfium"] = "pdfplumber"
+    # When images are decoded: "eager" (while loading), "keep" (when first needed) or "drop" (each time needed)
+    decode_policy: Literal["eager", "keep", "drop"] = "eager"
+    # Where the tasks run: "thread" (the thread of the tasks service) or "process" (a spawned worker process with
+    # its own pipeline and prediction cache)
+    task_executor: Literal["thread", "process"] = "thread"
+    # Number of tasks accepted by POST /compute and not processed yet before new tasks are rejected with a 503
+    task_queue_size: int = 8
+    # Seconds after which an accepted task that was never processed no longer counts against the queue size
+    task_admission_timeout: int = 3600
+    # Number of worker processes used to predict orientation and skew (0 or 1 runs on the calling process)
+    prediction_workers: int = 0
+    # Orientation predictor: "tesseract" (a tesseract process per image) or "tesserocr" (warm in-process engines)
+    orientation_engine: Literal["tesseract", "tesserocr"] = "tesseract"
+    # Decide the obvious orientations with projection profiles and only run the orientation engine on the others
+    orientation_cascade: bool = False
+    # Confidence, between 0 and 1, from which the projection profile orientation is kept
+    orientation_cascade_threshold: float = 0.5
+    # Number of text dense tiles the orientation engine is run on at most, voting on the orientation of the
+    # image (1 runs the engine on the whole image, a single tile has nothing to vote with)
+    orientation_tiles: int = Field(default=1, ge=1)
+    # Side, in pixels of the image the orientation engine receives, of the tiles
+    orientation_tile_size: int = 1000
+    # Number of pages spread over the document the orientation is predicted on, applied to the other pages
+    # when they agree (0 predicts the orientation of every page)
+    orientation_samples: int = 0
+    # Lowest orientation confidence of a sampled page, on the scale of the orientation engine (Tesseract's OSD
+    # confidence), for its orientation to be applied to the other pages. The pages decided by the cascade have
+    # passed orientation_cascade_threshold instead
+    orientation_sample_confidence: float = Field(default=2.0, ge=0)
+    # Number of warm Tesseract OSD engines kept by each process with the "tesserocr" engine
+    tesseract_pool_size: int = 2
+    # Megabytes of decoded images a task holds in memory, the others are spilled to memory-mapped files (0 is unlimited)
+    memory_budget_mb: int = 0
+    # Directory of the spill files of the memory budget (empty uses the default temporary directory)
+    spill_dir: str = ""
+    # Resolution, in dpi, of the grayscale images orientation and skew are predicted on (0 uses the full image)
+    analysis_dpi: int = 0
+    # Number of predictions kept in memory to skip already seen images (0 disables the cache)
+    prediction_cache_size: int = 0
+    # Directory where predictions are also stored to survive restarts (empty keeps them in memory only)
+    prediction_cache_dir: str = ""
+    # Load, predict and correct one page at a time instead of decoding the whole document up front
+    streaming: bool = False
+    # Copy pages that only need a quarter turn from the source document, adjusting their /Rotate entry
+    rotate_pages: bool = False
+    # Copy pages that need neither rotation nor deskewing from the source document unchanged
+    pass_through: bool = False
+    # How the skew is estimated: "hough" from the line segments of the edges, "projection" from the row profiles
+    # of a downscaled binary image
+    skew_engine: Literal["hough", "projection"] = "hough"
+    # Weight the angles of the detected line segments by their length with the "hough" skew engine
+    skew_length_weighted: bool = False
+    # Skew angle, in degrees, below which a page is considered not skewed
+    skew_tolerance: float = 0.1
+    # Deskew pages with a transformation matrix around their original content instead of re-rendering them
+    vector_skew: bool = False
+    # How corrected images are assembled into the output PDF: "reportlab" or "direct"
+    assembly_engine: Literal["reportlab", "direct"] = "reportlab"
+    # Rotate JPEG images that are not skewed losslessly with jpegtran instead of decoding and re-encoding them
+    lossless_jpeg: bool = False
+    # What the service returns: "pdf" for the corrected PDF, "analysis" for the predicted angles as JSON
+    output_mode: Literal["pdf", "analysis"] = "pdf"
+    # How corrected images are encoded: "default", "compact", "archive" or "bilevel" (empty keeps the engine's)
+    output_profile: Literal["", "default", "compact", "archive", "bilevel"] = ""
+    # JPEG quality of the output profile (0 keeps the quality of the profile)
+    output_jpeg_quality: int = 0
+    # Color mode of the output profile: "color", "gray", "bilevel" or "auto" (empty keeps the mode of the profile)
+    output_color_mode: Literal["", "color", "gray", "bilevel", "auto"] = ""
+    # Resolution, in dpi, corrected images are downsampled to by the output profile (0 keeps the profile's)
+    output_dpi: int = 0
+
+    @model_validator(mode="after")
+    def check_task_executor(self):
+        # The task worker process builds its own pipeline, which predicts on the worker process itself
+        if self.task_executor == "process" and self.prediction_workers > 1:
+            raise ValueError("PREDICTION_WORKERS can't be used with the \"process\" TASK_EXECUTOR")
+        return self
+
+
+@lru_cache()
+def get_correction_settings():
+    return CorrectionSettings()
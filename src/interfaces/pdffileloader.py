@@ -1,9 +1,85 @@
 from abc import ABC, abstractmethod
+from io import BytesIO
+import hashlib
+import cv2
+import numpy as np
+from PIL import Image as PILImage, UnidentifiedImageError
+
+# When images are decoded: "eager" decodes them while loading, "keep" decodes them the first time they are
+# needed and keeps them, "drop" decodes them each time they are needed and only keeps the encoded stream
+DECODE_POLICIES = ("eager", "keep", "drop")
 
 
 class PDFFileLoader(ABC):
 
+    def __init__(self, decode_policy="eager", budget=None, share_images=True):
+        """
+        Args:
+            decode_policy: one of DECODE_POLICIES
+            budget: optional MemoryBudget the decoded images are held within
+            share_images: when True, the images drawn on several pages of a document are described once,
+                          so that they are decoded once and the pages share them. Every distinct image
+                          is then held until the document is loaded
+        """
+        if decode_policy not in DECODE_POLICIES:
+            raise ValueError(f"Unknown decode policy '{decode_policy}', expected one of {DECODE_POLICIES}")
+        self.decode_policy = decode_policy
+        self.budget = budget
+        self.share_images = share_images
+
+    def distinct_image(self, distinct, stream, dpi, describe):
+        """
+        Describes an image once per distinct stream and resolution within a document
+        Args:
+            distinct: dict of the images already described in the document, updated
+            stream: encoded bytes of the image
+            dpi: resolution of the image on its page
+            describe: function returning the keyword arguments of the Image, None if it can't be read
+        Returns:
+            the keyword arguments of the Image, the same dict for every page drawing the image
+        """
+        if not self.share_images:
+            return describe()
+        key = (hashlib.sha256(stream).digest(), dpi)
+        if key not in distinct:
+            distinct[key] = describe()
+        return distinct[key]
+
+    def held(self, img):
+        """The decoded image, held within the memory budget if any"""
+        return self.budget.hold(img) if self.budget is not None else img
+
     @abstractmethod
     def process(self, filename: str):
         """Override this method with proper PDFFileLoader"""
         pass
+
+    def iter_pages(self, filename: str):
+        """
+        Yields the pages of the document one at a time.
+        Override this method when the loader is able to load the pages lazily.
+        """
+        yield from self.process(filename)
+
+    def encoded_image(self, stream, dpi=None, size=None):
+        """
+        Describes an image stream readable by OpenCV, decoded now or later depending on the decode policy
+        Args:
+            stream: encoded bytes of the image
+            dpi: resolution of the image on its page, if known
+            size: (width, height) of the image, if known
+        Returns:
+            the keyword arguments of the Image, None if the stream cannot be read
+        """
+        if self.decode_policy == "eager":
+            img = cv2.imdecode(np.frombuffer(stream, np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                return None
+            return {"raw_data": self.held(img), "stream": stream, "dpi": dpi}
+        # Only the header is read to check the stream, the pixels are decoded when needed
+        try:
+            PILImage.open(BytesIO(stream)).close()
+        except UnidentifiedImageError:
+            return None
+        return {"stream": stream, "dpi": dpi, "size": size, "keep_decoded": self.decode_policy == "keep",
+                "budget": self.budget}
@@ -2,8 +2,31 @@ from abc import ABC, abstractmethod
 
 
 class SkewPredictor(ABC):
+    # Resolution, in dpi, of the grayscale analysis image the predictor works on.
+    # None means the predictor receives the full resolution color image.
+    analysis_dpi = None
+    # Whether process also accepts an ImageAnalysis, whose grayscale, binary and edge images are
+    # shared with the other predictor working on the same input
+    accepts_analysis = False
 
     @abstractmethod
     def process(self, raw_img):
         """Override this method to process a raw image correctly."""
         pass
+
+    def cache_key(self):
+        """Identifies the predictor and its configuration, used to key cached predictions."""
+        return f"{type(self).__name__}:{self.analysis_dpi}"
+
+    def process_batch(self, raw_imgs, executor=None):
+        """
+        Processes several raw images, on the given executor if any
+        Args:
+            raw_imgs: list of raw images
+            executor: optional concurrent.futures.Executor used to process the images in parallel
+        Returns:
+            list of skew angles, in the same order as raw_imgs
+        """
+        if executor is None:
+            return [self.process(raw_img) for raw_img in raw_imgs]
+        return list(executor.map(self.process, raw_imgs))
@@ -1,8 +1,9 @@
 import asyncio
-import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response
 from common_code.config import get_settings
 from common_code.http_client import HttpClient
 from common_code.logger.logger import get_logger, Logger
@@ -19,13 +20,45 @@ from common_code.common.models import FieldDescription, ExecutionUnitTag
 from contextlib import asynccontextmanager
 
 # Imports required by the service's model
-from models.pdffile import PDFFile
-from services.pdfplumberloader import PDFPlumberLoader
-from services.cv2skewpredictor import CV2SkewPredictor
-from services.tesseractorientationpredictor import TesseractOrientationPredictor
-from services.pdf_corrector import PDFCorrector
+import metrics
+from admission import TaskAdmission, install_admission
+from config import get_correction_settings
+from pipeline import CorrectionPipeline
+from services.predictioncache import PredictionCache
 
 settings = get_settings()
+correction_settings = get_correction_settings()
+
+
+def _prediction_cache():
+    if correction_settings.prediction_cache_size <= 0:
+        return None
+    return PredictionCache(
+        max_entries=correction_settings.prediction_cache_size,
+        directory=correction_settings.prediction_cache_dir or None,
+    )
+
+
+# Pipeline of the task worker process, created by its first task. It predicts on the worker process itself and
+# its prediction cache is not exposed by /metrics
+_worker_pipeline = None
+
+
+def _run_in_worker(raw_pdf):
+    """Runs the correction pipeline in a task worker process"""
+    global _worker_pipeline
+    if _worker_pipeline is None:
+        _worker_pipeline = CorrectionPipeline(get_logger(settings), cache=_prediction_cache())
+    if correction_settings.output_mode == "analysis":
+        return _worker_pipeline.analyze(raw_pdf)
+    return _worker_pipeline.run(raw_pdf)
+
+
+def _data_out_fields():
+    if correction_settings.output_mode == "analysis":
+        # Only the predictions are returned, the document is not corrected
+        return [FieldDescription(name="analysis", type=[FieldDescriptionType.APPLICATION_JSON])]
+    return [FieldDescription(name="corrected_pdf", type=[FieldDescriptionType.APPLICATION_PDF])]
 
 
 class MyService(Service):
@@ -36,6 +69,11 @@ class MyService(Service):
     # Any additional fields must be excluded for Pydantic to work
     _model: object
     _logger: Logger
+    _executor: object
+    _cache: object
+    _pipeline: object
+    _task_executor: object
+    _admission: object
 
     def __init__(self):
         super().__init__(
@@ -53,11 +91,7 @@ class MyService(Service):
                     ],
                 ),
             ],
-            data_out_fields=[
-                FieldDescription(
-                    name="corrected_pdf", type=[FieldDescriptionType.APPLICATION_PDF]
-                ),
-            ],
+            data_out_fields=_data_out_fields(),
             tags=[
                 ExecutionUnitTag(
                     name=ExecutionUnitTagName.DOCUMENT_PROCESSING,
@@ -67,6 +101,49 @@ class MyService(Service):
             has_ai=False,
         )
         self._logger = get_logger(settings)
+        self._executor = None
+        self._cache = None
+        self._pipeline = None
+        self._task_executor = None
+        if correction_settings.task_executor == "process":
+            # The tasks service hands over one task at a time, a single worker process runs them
+            self._task_executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            if correction_settings.prediction_workers > 1:
+                # Workers are spawned lazily on the first task
+                self._executor = ProcessPoolExecutor(
+                    max_workers=correction_settings.prediction_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            self._cache = _prediction_cache()
+            if self._cache is not None:
+                metrics.register_prediction_cache(self._cache)
+            self._pipeline = CorrectionPipeline(self._logger, self._executor, self._cache)
+        # Tasks are admitted by POST /compute, before they are queued by the tasks service
+        self._admission = TaskAdmission(
+            capacity=correction_settings.task_queue_size,
+            lease_seconds=correction_settings.task_admission_timeout,
+        )
+        metrics.register_task_admission(self._admission)
+
+    @property
+    def admission(self):
+        return self._admission
+
+    def shutdown(self):
+        if self._task_executor is not None:
+            self._task_executor.shutdown(cancel_futures=True)
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+
+    def _run(self, raw_pdf):
+        if self._task_executor is not None:
+            # The worker process has its own pipeline, the service's one can't be sent to it. Only the thread of
+            # the tasks service waits for it, the event loop serving the API is not blocked
+            return self._task_executor.submit(_run_in_worker, raw_pdf).result()
+        if correction_settings.output_mode == "analysis":
+            return self._pipeline.analyze(raw_pdf)
+        return self._pipeline.run(raw_pdf)
 
     def process(self, data):
         try:
@@ -74,35 +151,21 @@ class MyService(Service):
             raw_pdf = data["PDF"].data  # This gets the raw bytes of the PDF file
             self._logger.info("Successfully extracted PDF bytes from request")
 
-            # Load and process the PDF using PDFPlumberLoader
-            pdfLoader = PDFPlumberLoader()
-            self._logger.info("Loading PDF with PDFPlumberLoader")
-            try:
-                pdf = PDFFile.ofBytes(raw_pdf, pdfLoader)
-            except Exception as e:
-                self._logger.error(f"Error loading PDF: {str(e)}")
-                raise ValueError("The uploaded file is not a valid PDF or contains no images.")
-
-            # Predict the orientation using TesseractOrientationPredictor
-            self._logger.info("Predicting orientation with TesseractOrientationPredictor")
-            orientation_predictor = TesseractOrientationPredictor()
-            pdf.predict_orientation(orientation_predictor)
-
-            # Predict the skew using CV2SkewPredictor
-            self._logger.info("Predicting skew with CV2SkewPredictor")
-            skew_predictor = CV2SkewPredictor()
-            pdf.predict_skew(skew_predictor)
-
-            # Correct the PDF
-            self._logger.info("Correcting PDF orientation and skew")
-            pdf_corrector = PDFCorrector()
-            corrected_pdf = pdf.to_corrected_pdf(pdf_corrector)
+            result, timer = self._run(raw_pdf)
+            metrics.publish(timer, len(raw_pdf), len(result))
+
+            if correction_settings.output_mode == "analysis":
+                self._logger.info("Successfully analyzed PDF")
+                return {
+                    "analysis": TaskData(data=result, type=FieldDescriptionType.APPLICATION_JSON)
+                }
 
+            corrected_pdf = result
             self._logger.info("Successfully processed and corrected PDF")
 
             # Return the corrected PDF in the expected format
             return {
-                "corrected_pdf": TaskData(data=corrected_pdf.getvalue(), type=FieldDescriptionType.APPLICATION_PDF)
+                "corrected_pdf": TaskData(data=corrected_pdf, type=FieldDescriptionType.APPLICATION_PDF)
             }
 
         except KeyError as e:
@@ -117,15 +180,19 @@ class MyService(Service):
             # Log any other errors and re-raise them
             self._logger.error(f"Error processing PDF: {str(e)}")
             raise
+        finally:
+            # The task no longer counts against the queue size
+            self._admission.release()
 
 
 service_service: ServiceService | None = None
+my_service: MyService | None = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Manual instances because startup events doesn't support Dependency Injection
-    global service_service
+    global service_service, my_service
 
     # Startup
     logger = get_logger(settings)
@@ -148,7 +215,7 @@ async def lifespan(app: FastAPI):
                 announced = await service_service.announce_service(my_service, engine_url)
                 retries -= 1
                 if not announced:
-                    time.sleep(settings.engine_announce_retry_delay)
+                    await asyncio.sleep(settings.engine_announce_retry_delay)
                     if retries == 0:
                         logger.warning(
                             f"Aborting service announcement after "
@@ -163,6 +230,7 @@ async def lifespan(app: FastAPI):
     # Shutdown
     for engine_url in settings.engine_urls:
         await service_service.graceful_shutdown(my_service, engine_url)
+    my_service.shutdown()
 
 api_description = """The PDF Orientation Correction service detects and corrects the orientation and skew
 of every page in a PDF.
@@ -204,9 +272,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+# Refuse new tasks instead of queuing them without bound when the task queue is full
+install_admission(
+    app,
+    lambda: my_service.admission if my_service is not None else None,
+    on_reject=metrics.TASKS_REJECTED.inc,
+)
+
+
 # Redirect to docs
 
 
 @app.get("/", include_in_schema=False)
 async def root():
     return RedirectResponse("/docs", status_code=301)
+
+
+@app.get("/metrics", tags=["Metrics"])
+async def get_metrics():
+    content, content_type = metrics.latest()
+    return Response(content=content, media_type=content_type)
@@ -0,0 +1,76 @@
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+from models.stagetimer import StageTimer
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+SIZE_BUCKETS = (1e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8, 5e8, 1e9)
+
+DOCUMENT_STAGE_SECONDS = Histogram(
+    "pdf_correction_document_stage_seconds",
+    "Time spent in each stage for a whole document",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+PAGE_STAGE_SECONDS = Histogram(
+    "pdf_correction_page_stage_seconds",
+    "Average time spent in each stage per page of a document",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+DOCUMENT_SECONDS = Histogram(
+    "pdf_correction_document_seconds",
+    "Total processing time of a document",
+    buckets=STAGE_BUCKETS,
+)
+DOCUMENT_PAGES = Histogram(
+    "pdf_correction_document_pages",
+    "Number of pages of the processed documents",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+DOCUMENT_BYTES = Histogram(
+    "pdf_correction_document_bytes",
+    "Size of the input and output documents",
+    ["direction"],
+    buckets=SIZE_BUCKETS,
+)
+IMAGE_PIXELS = Histogram(
+    "pdf_correction_image_pixels",
+    "Number of pixels of the processed images",
+    buckets=(1e5, 5e5, 1e6, 2e6, 4e6, 8e6, 1.6e7, 3.2e7, 6.4e7),
+)
+
+TASKS_ADMITTED = Gauge("pdf_correction_tasks_admitted", "Tasks accepted and not processed yet")
+TASKS_REJECTED = Counter("pdf_correction_tasks_rejected", "Tasks rejected because the task queue was full")
+
+PREDICTION_CACHE_HITS = Gauge("pdf_correction_prediction_cache_hits", "Predictions found in the cache")
+PREDICTION_CACHE_MISSES = Gauge("pdf_correction_prediction_cache_misses", "Predictions missing from the cache")
+
+
+def publish(timer: StageTimer, bytes_in, bytes_out):
+    """Publishes the durations and sizes collected while processing a document"""
+    pages = max(1, timer.pages)
+    for stage, seconds in timer.durations.items():
+        DOCUMENT_STAGE_SECONDS.labels(stage).observe(seconds)
+        PAGE_STAGE_SECONDS.labels(stage).observe(seconds / pages)
+    DOCUMENT_SECONDS.observe(sum(timer.durations.values()))
+    DOCUMENT_PAGES.observe(timer.pages)
+    DOCUMENT_BYTES.labels("in").observe(bytes_in)
+    DOCUMENT_BYTES.labels("out").observe(bytes_out)
+    for pixels in timer.image_pixels:
+        IMAGE_PIXELS.observe(pixels)
+
+
+def register_prediction_cache(cache):
+    """Exposes the hit and miss counters of the prediction cache"""
+    PREDICTION_CACHE_HITS.set_function(lambda: cache.hits)
+    PREDICTION_CACHE_MISSES.set_function(lambda: cache.misses)
+
+
+def register_task_admission(admission):
+    """Exposes the number of tasks admitted by POST /compute and not processed yet"""
+    TASKS_ADMITTED.set_function(lambda: admission.admitted)
+
+
+def latest():
+    """Returns the metrics in the Prometheus text format, with their content type"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,22 +1,262 @@
+from contextlib import nullcontext
+from typing import List
+import hashlib
+import logging
+import cv2
+import numpy as np
+
 from interfaces.orientationpredictor import OrientationPredictor
 from interfaces.skewpredictor import SkewPredictor
+from models.imageanalysis import ImageAnalysis
+
+logger = logging.getLogger(__name__)
+
+# Reduced JPEG decoding flags, by reduction factor
+REDUCED_GRAYSCALE_FLAGS = {
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+}
 
 
 class Image:
-    def __init__(self, raw_data):
+    def __init__(self, raw_data=None, stream=None, dpi=None, size=None, keep_decoded=True, budget=None):
+        """
+        Args:
+            raw_data: decoded BGR image. When None, the image is decoded from the stream the first time
+                      it is needed, which must then be readable by OpenCV
+            stream: the encoded bytes the image was decoded from, if known
+            dpi: resolution of the image on its page, if known
+            size: (width, height) of the image, if known, to avoid decoding it only to get its size
+            keep_decoded: whether a lazily decoded image is kept in memory. When False, it is decoded again
+                          each time it is needed and only the encoded stream stays resident
+            budget: optional MemoryBudget a lazily decoded image is kept within
+        """
+        if raw_data is None and stream is None:
+            raise ValueError("An image needs either its decoded data or its encoded stream")
         self.__raw_data = raw_data
+        # The encoded bytes the image was decoded from, if known
+        self.__stream = stream
+        # Resolution of the image on its page, if known
+        self.__dpi = dpi
+        self.__size = size
+        self.__keep_decoded = keep_decoded
+        self.__budget = budget
+        self.__content_hash = None
         self.__orientation = 0
+        self.__orientation_confidence = None
+        self.__orientation_confident = False
         self.__skew_orientation = 0
         self.__rotate = 0
 
+    @property
+    def raw_data(self):
+        if self.__raw_data is not None:
+            return self.__raw_data
+        raw_data = cv2.imdecode(np.frombuffer(self.__stream, np.uint8), cv2.IMREAD_COLOR)
+        if raw_data is None:
+            raise ValueError("Failed to decode the image stream")
+        if self.__keep_decoded:
+            if self.__budget is not None:
+                raw_data = self.__budget.hold(raw_data)
+            self.__raw_data = raw_data
+        return raw_data
+
+    @property
+    def decoded(self) -> bool:
+        """Whether the decoded image is held in memory"""
+        return self.__raw_data is not None
+
+    @property
+    def size(self):
+        """(width, height) of the image, decoding it only when the size is unknown"""
+        if self.__raw_data is not None:
+            return self.__raw_data.shape[1], self.__raw_data.shape[0]
+        if self.__size is None:
+            height, width = self.raw_data.shape[:2]
+            self.__size = (width, height)
+        return self.__size
+
+    @property
+    def stream(self):
+        return self.__stream
+
+    @property
+    def dpi(self):
+        return self.__dpi
+
+    @property
+    def content_hash(self):
+        """SHA-256 of the encoded stream, None if the stream is unknown"""
+        if self.__content_hash is None and self.__stream is not None:
+            self.__content_hash = hashlib.sha256(self.__stream).hexdigest()
+        return self.__content_hash
+
+    def cache_key(self, predictor):
+        """
+        Key of the prediction of the predictor on this image, None if the image cannot be cached. The same stream
+        drawn at another resolution is analysed at another scale, the resolutions are part of the key
+        """
+        if self.content_hash is None:
+            return None
+        key = f"{self.content_hash}:{self.__dpi}:{predictor.analysis_dpi}:{predictor.cache_key()}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @property
+    def orientation(self) -> int:
+        return self.__orientation
+
+    @property
+    def orientation_confidence(self):
+        """Confidence of the orientation predictor, on its own scale, None if it doesn't report one"""
+        return self.__orientation_confidence
+
+    @property
+    def orientation_confident(self) -> bool:
+        """Whether the orientation predictor vouched for the orientation, whatever its confidence"""
+        return self.__orientation_confident
+
+    @property
+    def rotate(self) -> int:
+        return self.__rotate
+
     @property
     def skew_angle(self) -> float:
         return self.__skew_orientation
 
-    def predict_orientation(self, predictor: OrientationPredictor):
-        result_prediction = predictor.process(self.__raw_data)
+    def analysis_image(self, target_dpi):
+        """
+        Returns a grayscale copy of the image downscaled to target_dpi (never upscaled).
+        JPEG streams are decoded directly at a reduced size when possible.
+        The result is not kept, predict_images shares it between the predictors of a chunk of images.
+        """
+        width, height = self.size
+        scale = 1.0
+        if self.__dpi and target_dpi and target_dpi < self.__dpi:
+            scale = target_dpi / self.__dpi
+
+        gray = None
+        if self.__stream is not None and self.__stream[:2] == b"\xff\xd8":
+            for factor, flag in REDUCED_GRAYSCALE_FLAGS.items():
+                if scale <= 1 / factor:
+                    gray = cv2.imdecode(np.frombuffer(self.__stream, np.uint8), flag)
+                    break
+        if gray is None:
+            gray = self.raw_data
+            if len(gray.shape) == 3:
+                gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+
+        target_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        if (gray.shape[1], gray.shape[0]) != target_size:
+            gray = cv2.resize(gray, target_size, interpolation=cv2.INTER_AREA)
+
+        return gray
+
+    def prediction_input(self, predictor):
+        """Returns the image the predictor works on: the analysis image or the full resolution one."""
+        if predictor.analysis_dpi is None:
+            return self.raw_data
+        return self.analysis_image(predictor.analysis_dpi)
+
+    def prediction_dpi(self, predictor):
+        """Resolution of the image the predictor works on, None if the resolution of the image is unknown"""
+        if not self.__dpi:
+            return None
+        if predictor.analysis_dpi is None:
+            return self.__dpi
+        return min(self.__dpi, predictor.analysis_dpi)
+
+    def prediction_analysis(self, predictor):
+        """Returns the ImageAnalysis of the image the predictor works on"""
+        return ImageAnalysis(self.prediction_input(predictor), self.prediction_dpi(predictor))
+
+    def _predictor_input(self, predictor):
+        analysis = self.prediction_analysis(predictor)
+        return analysis if predictor.accepts_analysis else analysis.image
+
+    def set_orientation(self, result_prediction):
         self.__orientation = result_prediction["orientation"]
         self.__rotate = result_prediction["rotate"]
+        self.__orientation_confidence = result_prediction.get("confidence")
+        self.__orientation_confident = bool(result_prediction.get("confident", False))
+
+    def set_skew(self, skew_angle):
+        self.__skew_orientation = skew_angle
+
+    def predict_orientation(self, predictor: OrientationPredictor):
+        self.set_orientation(predictor.process(self._predictor_input(predictor)))
 
     def predict_skew(self, predictor: SkewPredictor):
-        self.__skew_orientation = predictor.process(self.__raw_data)
+        self.set_skew(predictor.process(self._predictor_input(predictor)))
+
+
+def predict_images(images: List[Image], orientation_predictor: OrientationPredictor, skew_predictor: SkewPredictor,
+                   executor=None, cache=None, timer=None, chunk_size=16):
+    """
+    Predicts the orientation and skew of several images in a single pass. Both predictors are fed from one
+    ImageAnalysis per image and input resolution, so that the grayscale, binary and edge images are only
+    computed once. The analyses of chunk_size images at most are held in memory at a time.
+    The lazily decoded images whose stream turns out to be corrupt are not predicted, they keep no rotation
+    and no skew.
+    Args:
+        images: images to predict
+        orientation_predictor: OrientationPredictor instance, None to only predict the skew
+        skew_predictor: SkewPredictor instance, None to only predict the orientation
+        executor: optional concurrent.futures.Executor used to process the images in parallel. The intermediate
+                  images are only shared within the process computing them
+        cache: optional PredictionCache holding the predictions of already seen images
+        timer: optional StageTimer collecting the time spent in the "orientation" and "skew" stages
+        chunk_size: number of images analysed together
+    """
+    # An image drawn on several pages is predicted once
+    images = list({id(img): img for img in images}.values())
+    stages = ((orientation_predictor, Image.set_orientation, "orientation"), (skew_predictor, Image.set_skew, "skew"))
+    stages = [(predictor, apply, stage) for predictor, apply, stage in stages if predictor is not None]
+    for start in range(0, len(images), chunk_size):
+        analyses = {}
+        for predictor, apply, stage in stages:
+            with timer.stage(stage) if timer is not None else nullcontext():
+                pending = []
+                for img in images[start:start + chunk_size]:
+                    key = img.cache_key(predictor) if cache is not None else None
+                    result = cache.get(key) if key is not None else None
+                    if result is None:
+                        pending.append((img, key))
+                    else:
+                        apply(img, result)
+
+                decoded, inputs = [], []
+                for img, key in pending:
+                    analysis_key = (id(img), predictor.analysis_dpi)
+                    if analysis_key not in analyses:
+                        try:
+                            analyses[analysis_key] = img.prediction_analysis(predictor)
+                        except ValueError as e:
+                            logger.warning(f"Skipping the prediction of an image: {str(e)}")
+                            analyses[analysis_key] = None
+                    analysis = analyses[analysis_key]
+                    if analysis is None:
+                        continue
+                    decoded.append((img, key))
+                    inputs.append(analysis if predictor.accepts_analysis else analysis.image)
+
+                for (img, key), result in zip(decoded, predictor.process_batch(inputs, executor)):
+                    apply(img, result)
+                    if key is not None:
+                        cache.put(key, result)
+
+
+def predict_orientations(images: List[Image], predictor: OrientationPredictor, executor=None, cache=None):
+    """
+    Predicts the orientation of several images, in parallel when an executor is given.
+    Results are written back to the matching Image, cached results are reused.
+    """
+    predict_images(images, predictor, None, executor, cache)
+
+
+def predict_skews(images: List[Image], predictor: SkewPredictor, executor=None, cache=None):
+    """
+    Predicts the skew of several images, in parallel when an executor is given.
+    Results are written back to the matching Image, cached results are reused.
+    """
+    predict_images(images, None, predictor, executor, cache)
@@ -0,0 +1,75 @@
+import cv2
+
+
+class ImageAnalysis:
+    """
+    Intermediate images shared by the predictors working on the same input: grayscale, binarization and
+    edge map. Each one is computed the first time a predictor asks for it.
+    """
+
+    def __init__(self, image, dpi=None):
+        """
+        Args:
+            image: the BGR or grayscale image the predictors work on
+            dpi: resolution of the image, if known
+        """
+        self.__image = image
+        self.__dpi = dpi
+        self.__gray = None
+        self.__binary = None
+        self.__edges = None
+        self.__reduced_binaries = {}
+
+    @staticmethod
+    def of(image):
+        """Returns the analysis of the image, the image itself when it already is an analysis"""
+        return image if isinstance(image, ImageAnalysis) else ImageAnalysis(image)
+
+    @property
+    def image(self):
+        return self.__image
+
+    @property
+    def dpi(self):
+        """Resolution of the image, None if unknown"""
+        return self.__dpi
+
+    @property
+    def shape(self):
+        return self.__image.shape
+
+    @property
+    def gray(self):
+        if self.__gray is None:
+            if len(self.__image.shape) == 3:
+                self.__gray = cv2.cvtColor(self.__image, cv2.COLOR_BGR2GRAY)
+            else:
+                self.__gray = self.__image
+        return self.__gray
+
+    @property
+    def binary(self):
+        """Otsu binarization of the grayscale image, 1 for ink and 0 for paper"""
+        if self.__binary is None:
+            _, self.__binary = cv2.threshold(self.gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        return self.__binary
+
+    def reduced_binary(self, size):
+        """
+        Otsu binarization, 1 for ink and 0 for paper, of the grayscale image reduced so that its longest side
+        is at most size pixels, the binary image itself when it is already small enough
+        """
+        scale = size / max(self.shape[:2])
+        if scale >= 1:
+            return self.binary
+        if size not in self.__reduced_binaries:
+            gray = cv2.resize(self.gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            _, self.__reduced_binaries[size] = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        return self.__reduced_binaries[size]
+
+    @property
+    def edges(self):
+        """Canny edge map of the grayscale image"""
+        if self.__edges is None:
+            self.__edges = cv2.Canny(self.gray, 50, 150, apertureSize=3, L2gradient=True)
+        return self.__edges
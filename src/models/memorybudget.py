@@ -0,0 +1,75 @@
+import tempfile
+import threading
+import weakref
+import numpy as np
+
+
+class MemoryBudget:
+    """
+    Bounds the memory held by the decoded images of a task. The images that do not fit in the budget are
+    spilled to memory-mapped temporary files: their pixels are read back through the page cache without
+    being copied to the heap, and the kernel can evict them under memory pressure.
+    """
+
+    def __init__(self, max_bytes, directory=None):
+        """
+        Args:
+            max_bytes: number of bytes of decoded images held in memory at most
+            directory: directory of the spill files, None for the default temporary directory
+        """
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.__held = 0
+        self.__spilled = 0
+        self.__spilled_images = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def held(self):
+        """Number of bytes of the arrays held in memory that are still alive"""
+        return self.__held
+
+    @property
+    def spilled(self):
+        """Number of bytes spilled to disk so far"""
+        return self.__spilled
+
+    @property
+    def spilled_images(self):
+        return self.__spilled_images
+
+    def hold(self, array):
+        """
+        Accounts for a decoded image
+        Args:
+            array: the decoded image
+        Returns:
+            the array itself when it fits in the budget, a copy-on-write memory map of a spilled copy otherwise
+        """
+        nbytes = array.nbytes
+        if nbytes == 0:
+            return array
+        with self.__lock:
+            fits = self.__held + nbytes <= self.max_bytes
+            if fits:
+                self.__held += nbytes
+        if fits:
+            # The bytes are given back to the budget once the array is garbage collected
+            weakref.finalize(array, self._release, nbytes)
+            return array
+        return self._spill(array)
+
+    def _release(self, nbytes):
+        with self.__lock:
+            self.__held -= nbytes
+
+    def _spill(self, array):
+        # The file is unlinked right away, its space is reclaimed when the memory map is garbage collected
+        with tempfile.TemporaryFile(dir=self.directory) as spill_file:
+            np.ascontiguousarray(array).tofile(spill_file)
+            spill_file.flush()
+            spilled = np.memmap(spill_file, dtype=array.dtype, mode="c", shape=array.shape)
+        with self.__lock:
+            self.__spilled += array.nbytes
+            self.__spilled_images += 1
+        return spilled
@@ -1,6 +1,6 @@
 from typing import List
 
-from models.image import Image
+from models.image import Image, predict_images, predict_orientations, predict_skews
 from interfaces.orientationpredictor import OrientationPredictor
 from interfaces.skewpredictor import SkewPredictor
 
@@ -15,10 +15,12 @@ class Page:
     def images(self) -> List[Image]:
         return self.__images
 
-    def predict_orientation(self, predictor: OrientationPredictor):
-        for img in self.__images:
-            img.predict_orientation(predictor)
+    def predict_orientation(self, predictor: OrientationPredictor, executor=None, cache=None):
+        predict_orientations(self.__images, predictor, executor, cache)
 
-    def predict_skew(self, predictor: SkewPredictor):
-        for img in self.__images:
-            img.predict_skew(predictor)
+    def predict_skew(self, predictor: SkewPredictor, executor=None, cache=None):
+        predict_skews(self.__images, predictor, executor, cache)
+
+    def predict(self, orientation_predictor: OrientationPredictor, skew_predictor: SkewPredictor, executor=None,
+                cache=None, timer=None):
+        predict_images(self.__images, orientation_predictor, skew_predictor, executor, cache, timer)
@@ -1,48 +1,191 @@
 from typing import List
 from models.page import Page
-from models.image import Image
+from models.image import Image, predict_images, predict_orientations, predict_skews
+from models.stagetimer import StageTimer
 from interfaces.pdffileloader import PDFFileLoader
 from interfaces.orientationpredictor import OrientationPredictor
 from interfaces.skewpredictor import SkewPredictor
 import json
 from io import BytesIO
+import numpy as np
 
 
 class PDFFile:
-    def __init__(self, pages):
+    def __init__(self, pages, source=None):
         self.__pages: List[Page] = pages
+        # The original PDF (bytes, path or file-like object), used to copy pages verbatim
+        self.__source = source
 
-    def predict_orientation(self, predictor: OrientationPredictor):
-        for page in self.__pages:
-            page.predict_orientation(predictor)
+    @property
+    def images(self) -> List[Image]:
+        """The distinct images of the document, an image drawn on several pages is listed once"""
+        return list({id(img): img for page in self.__pages for img in page.images}.values())
 
-    def predict_skew(self, predictor: SkewPredictor):
-        for page in self.__pages:
-            page.predict_skew(predictor)
+    def predict_orientation(self, predictor: OrientationPredictor, executor=None, cache=None):
+        """
+        Predicts the orientation of every image of the document
+        Args:
+            predictor: OrientationPredictor instance
+            executor: optional concurrent.futures.Executor (e.g. a ProcessPoolExecutor) used to
+                      process the images in parallel
+            cache: optional PredictionCache holding the predictions of already seen images
+        """
+        predict_orientations(self.images, predictor, executor, cache)
+
+    def predict_skew(self, predictor: SkewPredictor, executor=None, cache=None):
+        """
+        Predicts the skew of every image of the document
+        Args:
+            predictor: SkewPredictor instance
+            executor: optional concurrent.futures.Executor (e.g. a ProcessPoolExecutor) used to
+                      process the images in parallel
+            cache: optional PredictionCache holding the predictions of already seen images
+        """
+        predict_skews(self.images, predictor, executor, cache)
+
+    def predict(self, orientation_predictor: OrientationPredictor, skew_predictor: SkewPredictor, executor=None,
+                cache=None, timer=None, orientation_samples=0, sample_confidence=0.0):
+        """
+        Predicts the orientation and skew of every image of the document in a single pass, sharing the
+        grayscale, binary and edge images between both predictors.
+        With orientation_samples, the orientation is first predicted on that many pages spread over the
+        document. When all their images agree with enough confidence, their orientation is applied to the
+        other pages, whose skew only is predicted. Otherwise every page is predicted.
+        Args:
+            orientation_predictor: OrientationPredictor instance
+            skew_predictor: SkewPredictor instance
+            executor: optional concurrent.futures.Executor (e.g. a ProcessPoolExecutor) used to
+                      process the images in parallel
+            cache: optional PredictionCache holding the predictions of already seen images
+            timer: optional StageTimer collecting the time spent predicting orientation and skew
+            orientation_samples: number of pages the orientation is sampled on, 0 to predict every page
+            sample_confidence: lowest orientation confidence of a sampled image, on the scale of the
+                               orientation engine, for its orientation to be applied to other pages. The images
+                               the predictor marks confident, e.g. those decided by the first stage of a
+                               cascade on its own scale, are not compared to it
+        Returns:
+            the orientation applied to the pages that were not sampled, None if every page was predicted
+        """
+        if not 0 < orientation_samples < len(self.__pages):
+            predict_images(self.images, orientation_predictor, skew_predictor, executor, cache, timer)
+            return None
+
+        sampled = set(np.linspace(0, len(self.__pages) - 1, orientation_samples).round().astype(int).tolist())
+        sample_images = [img for index in sorted(sampled) for img in self.__pages[index].images]
+        # The images shared with a sampled page are already predicted
+        sampled_ids = {id(img) for img in sample_images}
+        other_images = [img for index, page in enumerate(self.__pages) if index not in sampled
+                        for img in page.images if id(img) not in sampled_ids]
+        predict_images(sample_images, orientation_predictor, skew_predictor, executor, cache, timer)
+
+        orientation = self._agreed_orientation(sample_images, sample_confidence)
+        if orientation is None:
+            predict_images(other_images, orientation_predictor, skew_predictor, executor, cache, timer)
+            return None
+        for img in other_images:
+            img.set_orientation({"orientation": orientation, "rotate": (360 - orientation) % 360})
+        predict_images(other_images, None, skew_predictor, executor, cache, timer)
+        return orientation
+
+    @staticmethod
+    def _agreed_orientation(images, min_confidence):
+        """The orientation of the images if they all share it with enough confidence, None otherwise"""
+        orientations = {img.orientation for img in images}
+        if len(orientations) != 1:
+            return None
+        if any(not img.orientation_confident and (img.orientation_confidence or 0.0) < min_confidence
+               for img in images):
+            return None
+        return orientations.pop()
+
+    @staticmethod
+    def _page_of(dpage, shared) -> Page:
+        """
+        Creates the page, the images the loader gave for several pages become a single Image shared by these
+        pages, predicted and corrected once. shared maps the id of these images to their Image, None to not
+        share any image
+        """
+        if shared is None:
+            return Page(dpage['page_number'], dpage["rotation"],
+                        [Image(**img) if isinstance(img, dict) else Image(img) for img in dpage['images']])
+        images = []
+        for img in dpage['images']:
+            if id(img) not in shared:
+                # Loaders give either the decoded image or a dict of Image arguments. The loaded image is
+                # kept along with its Image so that its id is not reused
+                shared[id(img)] = (img, Image(**img) if isinstance(img, dict) else Image(img))
+            images.append(shared[id(img)][1])
+        return Page(dpage['page_number'], dpage["rotation"], images)
 
     @classmethod
     def of(cls, pdf_data: bytes, loader: PDFFileLoader):
         dict_pages = loader.process(pdf_data)  # Pass bytes to the loader
-        pages = []
-        for dpage in dict_pages:
-            images = []
-            for img in dpage['images']:
-                images.append(Image(img))
-            pages.append(Page(dpage['page_number'], dpage["rotation"], images))
-        return PDFFile(pages)
+        shared = {}
+        return PDFFile([cls._page_of(dpage, shared) for dpage in dict_pages], pdf_data)
 
     @classmethod
     def ofBytes(cls, pdf_data: bytes, loader: PDFFileLoader):
         dict_pages = loader.processBytes(pdf_data)  # Pass bytes to the loader
-        pages = []
-        for dpage in dict_pages:
-            images = []
-            for img in dpage['images']:
-                images.append(Image(img))
-            pages.append(Page(dpage['page_number'], dpage["rotation"], images))
-        return PDFFile(pages)
+        shared = {}
+        return PDFFile([cls._page_of(dpage, shared) for dpage in dict_pages], pdf_data)
+
+    @classmethod
+    def stream(cls, pdf_data: bytes, loader: PDFFileLoader):
+        """
+        Yields the pages of the document one at a time, as the loader decodes them
+        Args:
+            pdf_data: bytes of the PDF file
+            loader: PDFFileLoader instance
+        """
+        # Sharing the images would keep them all until the end of the document
+        shared = {} if loader.share_images else None
+        for dpage in loader.iter_pages(BytesIO(pdf_data)):
+            yield cls._page_of(dpage, shared)
+
+    @classmethod
+    def stream_corrected_pdf(cls, pdf_data: bytes, loader: PDFFileLoader, orientation_predictor: OrientationPredictor,
+                             skew_predictor: SkewPredictor, corrector, executor=None, cache=None, timer=None):
+        """
+        Loads, predicts and corrects the document one page at a time, so that only the page being
+        processed is held decoded in memory
+        Args:
+            pdf_data: bytes of the PDF file
+            loader: PDFFileLoader instance
+            orientation_predictor: OrientationPredictor instance
+            skew_predictor: SkewPredictor instance
+            corrector: PDFCorrector instance
+            executor: optional concurrent.futures.Executor used to process the images of a page in parallel
+            cache: optional PredictionCache holding the predictions of already seen images
+            timer: optional StageTimer collecting the time spent loading and predicting the pages
+        Returns:
+            BytesIO object containing the corrected PDF
+        """
+        timer = timer if timer is not None else StageTimer()
+
+        def predicted_pages():
+            pages = cls.stream(pdf_data, loader)
+            while True:
+                with timer.stage("load"):
+                    try:
+                        page = next(pages, None)
+                    except Exception as e:
+                        # Same error as loading the whole document up front
+                        raise ValueError("The uploaded file is not a valid PDF or contains no images.") from e
+                if page is None:
+                    return
+                page.predict(orientation_predictor, skew_predictor, executor, cache, timer)
+                yield page
+
+        output_pdf = BytesIO()
+        corrector.correct_pages(predicted_pages(), output_pdf, pdf_data)
+        return output_pdf
 
     def to_json(self):
+        """
+        Serializes the predictions: for each page, its rotation, the skew angle of its images and, for each
+        image, its predicted orientation, the rotation correcting it, the confidence of the orientation
+        predictor (None if it doesn't report one) and its skew angle
+        """
         if not self.__pages:
             return json.dumps({"result": "No images found in PDF"})
         result = []
@@ -50,7 +193,17 @@ class PDFFile:
             page_data = {
                 "page_number": page.page_number,
                 "rotation": page.rotation,
-                "skew_angles": [img.skew_angle for img in page.images]
+                "skew_angles": [float(img.skew_angle) for img in page.images],
+                "images": [
+                    {
+                        "orientation": int(img.orientation),
+                        "rotate": int(img.rotate),
+                        "orientation_confidence": (None if img.orientation_confidence is None
+                                                   else float(img.orientation_confidence)),
+                        "skew_angle": float(img.skew_angle),
+                    }
+                    for img in page.images
+                ],
             }
             result.append(page_data)
         return json.dumps(result)
@@ -70,3 +223,7 @@ class PDFFile:
     @property
     def pages(self):
         return self.__pages
+
+    @property
+    def source(self):
+        return self.__source
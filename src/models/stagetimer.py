@@ -0,0 +1,30 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """
+    Collects the duration of each processing stage of a document, along with its page count and the size
+    of its images
+    """
+
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.pages = 0
+        self.image_pixels = []
+
+    @contextmanager
+    def stage(self, name):
+        """Adds the time spent in the with block to the duration of the stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] += time.perf_counter() - start
+
+    def add_page(self, page):
+        self.pages += 1
+        for image in page.images:
+            width, height = image.size
+            self.image_pixels.append(width * height)
@@ -0,0 +1,193 @@
+from config import get_correction_settings
+from models.memorybudget import MemoryBudget
+from models.pdffile import PDFFile
+from models.stagetimer import StageTimer
+from services.pdfplumberloader import PDFPlumberLoader
+from services.pdfiumloader import PDFiumLoader
+from services.cv2skewpredictor import CV2SkewPredictor
+from services.cascadeorientationpredictor import CascadeOrientationPredictor
+from services.projectionorientationpredictor import ProjectionOrientationPredictor
+from services.projectionskewpredictor import ProjectionSkewPredictor
+from services.tesseractorientationpredictor import TesseractOrientationPredictor
+from services.tesserocrorientationpredictor import TesserocrOrientationPredictor
+from services.tiledorientationpredictor import TiledOrientationPredictor
+from services.outputprofile import OutputProfile
+from services.pdf_corrector import PDFCorrector
+
+correction_settings = get_correction_settings()
+
+
+class CorrectionPipeline:
+    """
+    Loads a PDF, predicts the orientation and skew of its images and corrects them, with the components
+    selected by the correction settings
+    """
+
+    def __init__(self, logger, executor=None, cache=None):
+        """
+        Args:
+            logger: logger of the service
+            executor: optional concurrent.futures.Executor the predictions are run on
+            cache: optional PredictionCache shared by the documents
+        """
+        self._logger = logger
+        self._executor = executor
+        self._cache = cache
+
+    @staticmethod
+    def _memory_budget():
+        """A memory budget for the decoded images of one task, None when unlimited"""
+        if correction_settings.memory_budget_mb <= 0:
+            return None
+        return MemoryBudget(correction_settings.memory_budget_mb * 2 ** 20, correction_settings.spill_dir or None)
+
+    def _loader(self, budget=None):
+        # Streaming only holds one page at a time, the images drawn on several pages are not shared then
+        loader_class = PDFiumLoader if correction_settings.loader_engine == "pdfium" else PDFPlumberLoader
+        return loader_class(decode_policy=correction_settings.decode_policy, budget=budget,
+                            share_images=not correction_settings.streaming)
+
+    def _log_budget(self, budget):
+        if budget is not None and budget.spilled_images:
+            self._logger.info(f"Memory budget exceeded: {budget.spilled_images} images, "
+                              f"{budget.spilled / 2 ** 20:.1f} MB, spilled to disk")
+
+    def _orientation_predictor(self):
+        analysis_dpi = correction_settings.analysis_dpi or None
+        if correction_settings.orientation_engine == "tesserocr":
+            predictor = TesserocrOrientationPredictor(
+                pool_size=correction_settings.tesseract_pool_size, analysis_dpi=analysis_dpi
+            )
+        else:
+            predictor = TesseractOrientationPredictor(analysis_dpi=analysis_dpi)
+        if correction_settings.orientation_tiles > 1:
+            predictor = TiledOrientationPredictor(
+                predictor, max_tiles=correction_settings.orientation_tiles,
+                tile_size=correction_settings.orientation_tile_size,
+            )
+        if correction_settings.orientation_cascade:
+            return CascadeOrientationPredictor(
+                ProjectionOrientationPredictor(analysis_dpi=analysis_dpi),
+                predictor,
+                threshold=correction_settings.orientation_cascade_threshold,
+            )
+        return predictor
+
+    @staticmethod
+    def _output_profile(name):
+        """The output profile of the settings, None to keep the encoding of the assembly engine"""
+        name = name or correction_settings.output_profile
+        if not name:
+            return None
+        return OutputProfile.named(
+            name,
+            jpeg_quality=correction_settings.output_jpeg_quality or None,
+            color_mode=correction_settings.output_color_mode or None,
+            dpi=correction_settings.output_dpi or None,
+        )
+
+    def _predicted_document(self, raw_pdf, pdfLoader, orientation_predictor, skew_predictor, timer):
+        self._logger.info(f"Loading PDF with {type(pdfLoader).__name__}")
+        try:
+            with timer.stage("load"):
+                pdf = PDFFile.ofBytes(raw_pdf, pdfLoader)
+        except Exception as e:
+            self._logger.error(f"Error loading PDF: {str(e)}")
+            raise ValueError("The uploaded file is not a valid PDF or contains no images.")
+
+        # Predict the orientation and the skew, sharing the preprocessing of the images
+        self._logger.info(f"Predicting orientation with {type(orientation_predictor).__name__} "
+                          f"and skew with {type(skew_predictor).__name__}")
+        orientation = pdf.predict(
+            orientation_predictor, skew_predictor, self._executor, self._cache, timer,
+            orientation_samples=correction_settings.orientation_samples,
+            sample_confidence=correction_settings.orientation_sample_confidence,
+        )
+        if orientation is not None:
+            self._logger.info(f"Sampled pages agree on orientation {orientation}, applied to the other pages")
+        if isinstance(orientation_predictor, CascadeOrientationPredictor):
+            self._logger.info(f"{orientation_predictor.decided} images oriented from their projection profiles, "
+                              f"{orientation_predictor.deferred} by {type(orientation_predictor.fallback).__name__}")
+        return pdf
+
+    @staticmethod
+    def _skew_predictor():
+        analysis_dpi = correction_settings.analysis_dpi or None
+        if correction_settings.skew_engine == "projection":
+            return ProjectionSkewPredictor(analysis_dpi=analysis_dpi)
+        return CV2SkewPredictor(analysis_dpi=analysis_dpi, length_weighted=correction_settings.skew_length_weighted)
+
+    def _process_document(self, raw_pdf, pdfLoader, orientation_predictor, skew_predictor, pdf_corrector, timer):
+        pdf = self._predicted_document(raw_pdf, pdfLoader, orientation_predictor, skew_predictor, timer)
+
+        # Correct the PDF
+        self._logger.info("Correcting PDF orientation and skew")
+        return pdf.to_corrected_pdf(pdf_corrector)
+
+    def analyze(self, raw_pdf):
+        """
+        Predicts the orientation and skew of every page of the PDF without correcting it
+        Args:
+            raw_pdf: bytes of the PDF
+        Returns:
+            (bytes of the JSON predictions, see PDFFile.to_json, StageTimer holding the duration of each stage)
+        """
+        timer = StageTimer()
+        budget = self._memory_budget()
+        pdf = self._predicted_document(
+            raw_pdf, self._loader(budget), self._orientation_predictor(),
+            self._skew_predictor(), timer,
+        )
+        # The pages are counted by the corrector otherwise
+        for page in pdf.pages:
+            timer.add_page(page)
+        self._logger.info(f"Stage durations: {dict(timer.durations)}")
+        self._log_budget(budget)
+        return pdf.to_json().encode(), timer
+
+    def run(self, raw_pdf, output_profile=None):
+        """
+        Corrects the orientation and skew of every page of the PDF
+        Args:
+            raw_pdf: bytes of the PDF
+            output_profile: name of the output profile used for this document instead of the one of the settings
+        Returns:
+            (bytes of the corrected PDF, StageTimer holding the duration of each stage)
+        """
+        # Components of the correction pipeline
+        timer = StageTimer()
+        budget = self._memory_budget()
+        pdfLoader = self._loader(budget)
+        orientation_predictor = self._orientation_predictor()
+        skew_predictor = self._skew_predictor()
+        pdf_corrector = PDFCorrector(
+            rotate_pages=correction_settings.rotate_pages,
+            skew_tolerance=correction_settings.skew_tolerance,
+            vector_skew=correction_settings.vector_skew,
+            engine=correction_settings.assembly_engine,
+            timer=timer,
+            lossless_jpeg=correction_settings.lossless_jpeg,
+            output_profile=self._output_profile(output_profile),
+            pass_through=correction_settings.pass_through,
+        )
+
+        if correction_settings.streaming:
+            # Load, predict and correct one page at a time to bound the memory usage
+            self._logger.info(f"Correcting PDF page by page with {type(pdfLoader).__name__}, "
+                              f"{type(orientation_predictor).__name__} and {type(skew_predictor).__name__}")
+            corrected_pdf = PDFFile.stream_corrected_pdf(
+                raw_pdf, pdfLoader, orientation_predictor, skew_predictor, pdf_corrector, self._executor,
+                self._cache, timer,
+            )
+        else:
+            corrected_pdf = self._process_document(
+                raw_pdf, pdfLoader, orientation_predictor, skew_predictor, pdf_corrector, timer
+            )
+
+        self._logger.info(f"Stage durations: {dict(timer.durations)}")
+        if pdf_corrector.copied_pages:
+            self._logger.info(f"{pdf_corrector.copied_pages} pages copied from the source document")
+        self._log_budget(budget)
+        if self._cache is not None:
+            self._logger.info(f"Prediction cache: {self._cache.stats()}")
+        return corrected_pdf.getvalue(), timer
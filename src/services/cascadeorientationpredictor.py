@@ -0,0 +1,61 @@
+from interfaces.orientationpredictor import OrientationPredictor
+from models.imageanalysis import ImageAnalysis
+
+
+class CascadeOrientationPredictor(OrientationPredictor):
+    """
+    Runs a cheap orientation predictor first and only asks the expensive one about the images the
+    cheap one is not confident enough about. The confidences of both stages are on different scales, the
+    predictions kept from the first stage are marked "confident" instead.
+    """
+    accepts_analysis = True
+
+    def __init__(self, first_stage: OrientationPredictor, fallback: OrientationPredictor, threshold=0.5):
+        """
+        Args:
+            first_stage: cheap predictor returning a "confidence" between 0 and 1 along with its prediction
+            fallback: predictor used when the confidence of the first stage is below the threshold
+            threshold: confidence from which the prediction of the first stage is kept
+        """
+        self.first_stage = first_stage
+        self.fallback = fallback
+        self.threshold = threshold
+        # The images run through both stages receive the input of the fallback
+        self.analysis_dpi = fallback.analysis_dpi
+        # Number of images decided by the first stage and by the fallback
+        self.decided = 0
+        self.deferred = 0
+
+    def cache_key(self):
+        return (f"{type(self).__name__}:{self.first_stage.cache_key()}:{self.fallback.cache_key()}:"
+                f"{self.threshold}")
+
+    @staticmethod
+    def _input(stage, raw_img):
+        """The input of the stage, an analysis only if the stage accepts it"""
+        if isinstance(raw_img, ImageAnalysis) and not stage.accepts_analysis:
+            return raw_img.image
+        return raw_img
+
+    def _confident(self, result):
+        return result.get("confidence", 0.0) >= self.threshold
+
+    def process(self, raw_img):
+        result = self.first_stage.process(self._input(self.first_stage, raw_img))
+        if self._confident(result):
+            self.decided += 1
+            return dict(result, confident=True)
+        self.deferred += 1
+        return self.fallback.process(self._input(self.fallback, raw_img))
+
+    def process_batch(self, raw_imgs, executor=None):
+        results = self.first_stage.process_batch([self._input(self.first_stage, img) for img in raw_imgs], executor)
+        unsure = [index for index, result in enumerate(results) if not self._confident(result)]
+        self.decided += len(results) - len(unsure)
+        results = [dict(result, confident=True) if self._confident(result) else result for result in results]
+        self.deferred += len(unsure)
+        # The fallback keeps its own batching, e.g. the engine pool of tesserocr
+        fallback_imgs = [self._input(self.fallback, raw_imgs[index]) for index in unsure]
+        for index, result in zip(unsure, self.fallback.process_batch(fallback_imgs, executor)):
+            results[index] = result
+        return results
@@ -1,9 +1,38 @@
 import cv2
 import numpy as np
 from interfaces.skewpredictor import SkewPredictor
+from models.imageanalysis import ImageAnalysis
 
 
 class CV2SkewPredictor(SkewPredictor):
+    accepts_analysis = True
+
+    def __init__(self, analysis_dpi=None, reference_dpi=300, length_weighted=False):
+        """
+        Args:
+            analysis_dpi: resolution of the grayscale analysis image to work on, None to work on
+                          the full resolution image
+            reference_dpi: resolution the Hough parameters are tuned for, they are scaled
+                           to the resolution of the image worked on when it is known
+            length_weighted: when True, the skew is the median of the segment angles weighted by the
+                             segment lengths, so that long text lines and rules outweigh short noisy segments
+        """
+        self.analysis_dpi = analysis_dpi
+        self.reference_dpi = reference_dpi
+        self.length_weighted = length_weighted
+
+    def cache_key(self):
+        return f"{type(self).__name__}:{self.analysis_dpi}:{self.reference_dpi}:{self.length_weighted}"
+
+    def hough_parameters(self, dpi=None):
+        """
+        Returns the (threshold, min_line_length, max_line_gap) of HoughLinesP for an image of the given
+        resolution, the parameters of the reference resolution when it is unknown
+        """
+        scale = 1.0
+        if dpi:
+            scale = dpi / self.reference_dpi
+        return max(1, round(100 * scale)), max(1, round(120 * scale)), max(1, round(10 * scale))
 
     def image_with_lines(self, raw_img, lines):
         img = raw_img.copy()
@@ -29,46 +58,36 @@ class CV2SkewPredictor(SkewPredictor):
         return img
 
     def calculate_angles(self, lines):
-        angles = []
-        if lines is not None:
-            for rho, theta in lines[:, 0]:
-                angle = (theta * 180 / np.pi) - 90
-                angles.append(angle)
-        return np.array(angles)
+        if lines is None:
+            return np.array([])
+        return np.degrees(lines[:, 0, 1].astype(np.float64)) - 90
+
+    @staticmethod
+    def _segment_deltas(lines):
+        """(dx, dy) of every HoughLinesP segment, as floats"""
+        segments = lines[:, 0].astype(np.float64)
+        return segments[:, 2] - segments[:, 0], segments[:, 3] - segments[:, 1]
 
     def calculate_anglesP(self, lines):
-        angles = []
-        if lines is not None:
-            for x1, y1, x2, y2 in lines[:, 0]:
-                dx = x2 - x1
-                dy = y2 - y1
-                angle = np.arctan2(dy, dx) * 180 / np.pi
-                angles.append(angle)
-        return np.array(angles)
+        if lines is None:
+            return np.array([])
+        dx, dy = self._segment_deltas(lines)
+        return np.degrees(np.arctan2(dy, dx))
+
+    def segment_lengths(self, lines):
+        if lines is None:
+            return np.array([])
+        return np.hypot(*self._segment_deltas(lines))
 
     def lines_with_vertical_filter(self, lines, threshold):
-        np_lines = np.array(lines)
-        angles = np.zeros(lines.shape[0])
-        if lines is not None:
-            for i in range(lines.shape[0]):
-                rho, theta = lines[i, 0]
-                angles[i] = (theta * 180 / np.pi) - 90
-            index = self.get_index_filtered_vertical_angles(angles, threshold)
-            np_lines = np_lines[index]
-        return np_lines
+        if lines is None:
+            return np.array(lines)
+        return lines[self.get_index_filtered_vertical_angles(self.calculate_angles(lines), threshold)]
 
     def lines_with_vertical_filterP(self, lines, threshold):
-        np_lines = np.array(lines)
-        angles = np.zeros(lines.shape[0])
-        if lines is not None:
-            for i in range(lines.shape[0]):
-                x1, y1, x2, y2 = lines[i, 0]
-                dx = x2 - x1
-                dy = y2 - y1
-                angles[i] = np.arctan2(dy, dx) * 180 / np.pi
-            index = self.get_index_filtered_vertical_angles(angles, threshold)
-            np_lines = np_lines[index]
-        return np_lines
+        if lines is None:
+            return np.array(lines)
+        return lines[self.get_index_filtered_vertical_angles(self.calculate_anglesP(lines), threshold)]
 
     def get_index_filtered_vertical_angles(self, angles, threshold):
         arounde_0 = np.abs(angles - 0) < threshold
@@ -79,16 +98,29 @@ class CV2SkewPredictor(SkewPredictor):
     def filter_vertical_angles(self, angles, threshold=10):
         return np.array(angles)[self.get_index_filtered_vertical_angles(angles, threshold)]
 
+    @staticmethod
+    def weighted_median(values, weights):
+        """Value below and above which lie half of the total weight"""
+        order = np.argsort(values)
+        cumulative = np.cumsum(weights[order])
+        return values[order][np.searchsorted(cumulative, cumulative[-1] / 2)]
+
     def process(self, raw_img):
         if raw_img is None:
             raise ValueError("Input image is None; cannot process skew prediction.")
-        edges = cv2.Canny(raw_img, 50, 150, apertureSize=3, L2gradient=True)
-        lines = cv2.HoughLinesP(edges, 1, np.pi / 180, 100, minLineLength=120, maxLineGap=10)
+        analysis = ImageAnalysis.of(raw_img)
+        threshold, min_line_length, max_line_gap = self.hough_parameters(analysis.dpi)
+        edges = analysis.edges
+        lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold, minLineLength=min_line_length,
+                                maxLineGap=max_line_gap)
         # lines_filtered = self.lines_with_vertical_filterP(lines, 10)
         angles = self.calculate_anglesP(lines)
-        angles = self.filter_vertical_angles(angles, 10)
+        index = self.get_index_filtered_vertical_angles(angles, 10)
+        angles = angles[index]
 
         if np.size(angles) > 0:
+            if self.length_weighted:
+                return self.weighted_median(angles, self.segment_lengths(lines)[index])
             md_angle = np.median(angles)
             return md_angle
         else:
@@ -0,0 +1,67 @@
+import shutil
+import struct
+import subprocess
+
+# Lossless JPEG transformations are delegated to jpegtran (libjpeg-turbo-progs), when installed
+JPEGTRAN = shutil.which("jpegtran")
+
+# Start of frame markers of the baseline, extended and progressive Huffman coded JPEGs
+SOF_MARKERS = (0xC0, 0xC1, 0xC2)
+
+
+def available():
+    return JPEGTRAN is not None
+
+
+def jpeg_info(stream):
+    """
+    Reads the frame header of a JPEG stream
+    Returns:
+        (width, height, components), None if the stream is not a Huffman coded JPEG
+    """
+    if stream[:2] != b"\xff\xd8":
+        return None
+    position = 2
+    while position + 4 <= len(stream):
+        if stream[position] != 0xFF:
+            return None
+        marker = stream[position + 1]
+        if marker == 0xFF:
+            # Fill byte
+            position += 1
+            continue
+        length = struct.unpack(">H", stream[position + 2:position + 4])[0]
+        if marker in SOF_MARKERS:
+            if position + 10 > len(stream):
+                return None
+            height, width, components = struct.unpack(">HHB", stream[position + 5:position + 10])
+            return width, height, components
+        if marker == 0xDA:
+            # Start of scan without a frame header
+            return None
+        position += 2 + length
+    return None
+
+
+def rotate(stream, clockwise):
+    """
+    Rotates a JPEG stream clockwise by a multiple of 90 degrees in the DCT domain, without decoding it.
+    The blocks of the partial MCUs that cannot be moved along the edges which become the right or bottom
+    edge are dropped, which trims less than one MCU (16 pixels at most) from these edges.
+    Args:
+        stream: bytes of the JPEG
+        clockwise: 90, 180 or 270
+    Returns:
+        bytes of the rotated JPEG, None if jpegtran is not available or fails
+    """
+    if JPEGTRAN is None:
+        return None
+    # Try a perfect transformation first, the image is only trimmed when it has partial MCUs
+    for edges in ("-perfect", "-trim"):
+        result = subprocess.run(
+            [JPEGTRAN, "-copy", "none", edges, "-rotate", str(clockwise)],
+            input=stream, capture_output=True,
+        )
+        if result.returncode == 0 and result.stdout:
+            return result.stdout
+    return None
@@ -0,0 +1,157 @@
+import math
+from io import BytesIO
+import cv2
+import numpy as np
+from PIL import Image as PILImage
+
+# OpenCV JPEG sampling factors, by chroma subsampling
+JPEG_SAMPLING_FACTORS = {
+    "4:4:4": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_444,
+    "4:2:2": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_422,
+    "4:2:0": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420,
+}
+
+# TIFF tags locating the encoded strips
+STRIP_OFFSETS = 273
+STRIP_BYTE_COUNTS = 279
+
+
+class OutputProfile:
+    """
+    How the corrected images are encoded in the output PDF: JPEG quality and chroma subsampling, color,
+    grayscale or CCITT G4 bilevel images, and resolution
+    """
+
+    COLOR_MODES = ("color", "gray", "bilevel", "auto")
+
+    # Named profiles, "default" matches the encoding of the direct assembly engine
+    PROFILES = {
+        "default": {},
+        "compact": {"jpeg_quality": 60, "color_mode": "auto", "dpi": 200},
+        "archive": {"jpeg_quality": 90, "jpeg_subsampling": "4:4:4"},
+        "bilevel": {"color_mode": "bilevel", "dpi": 300},
+    }
+
+    def __init__(self, jpeg_quality=75, jpeg_subsampling="4:2:0", color_mode="color", dpi=None,
+                 bilevel_ratio=0.97, gray_tolerance=20):
+        """
+        Args:
+            jpeg_quality: quality of the JPEG images, from 1 to 100
+            jpeg_subsampling: chroma subsampling of the color JPEG images: "4:4:4", "4:2:2" or "4:2:0"
+            color_mode: "color" keeps the images as they are, "gray" encodes them as grayscale JPEG,
+                        "bilevel" as black and white CCITT G4 and "auto" picks the smallest of the three
+                        that keeps the look of each image
+            dpi: resolution the images are downsampled to when their resolution is known and higher,
+                 None to keep their resolution
+            bilevel_ratio: with "auto", share of the pixels that must be close to black or white for the
+                           image to be encoded as black and white
+            gray_tolerance: with "auto", largest difference between the channels of a pixel for the image
+                            to be encoded as grayscale
+        """
+        if color_mode not in self.COLOR_MODES:
+            raise ValueError(f"Unknown color mode '{color_mode}', expected one of {self.COLOR_MODES}")
+        if jpeg_subsampling not in JPEG_SAMPLING_FACTORS:
+            raise ValueError(f"Unknown chroma subsampling '{jpeg_subsampling}', "
+                             f"expected one of {tuple(JPEG_SAMPLING_FACTORS)}")
+        self.jpeg_quality = jpeg_quality
+        self.jpeg_subsampling = jpeg_subsampling
+        self.color_mode = color_mode
+        self.dpi = dpi
+        self.bilevel_ratio = bilevel_ratio
+        self.gray_tolerance = gray_tolerance
+
+    @classmethod
+    def named(cls, name, **overrides):
+        """
+        Returns the named profile, with some of its settings overridden
+        Args:
+            name: one of PROFILES
+            overrides: OutputProfile arguments replacing the ones of the profile, ignored when None
+        """
+        if name not in cls.PROFILES:
+            raise ValueError(f"Unknown output profile '{name}', expected one of {tuple(cls.PROFILES)}")
+        arguments = dict(cls.PROFILES[name])
+        arguments.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(**arguments)
+
+    def _color_mode_of(self, img):
+        """The color mode an image is encoded with, judged on a sample of its pixels with "auto" """
+        if self.color_mode != "auto":
+            return self.color_mode
+        sample = img[::4, ::4]
+        if len(sample.shape) == 3:
+            spread = sample.max(axis=2).astype(np.int16) - sample.min(axis=2)
+            if np.percentile(spread, 99) > self.gray_tolerance:
+                return "color"
+            sample = cv2.cvtColor(sample, cv2.COLOR_BGR2GRAY)
+        extreme = np.count_nonzero((sample < 64) | (sample > 192))
+        return "bilevel" if extreme >= self.bilevel_ratio * sample.size else "gray"
+
+    def _resized(self, img, dpi):
+        if self.dpi is None or not dpi or dpi <= self.dpi:
+            return img
+        scale = self.dpi / dpi
+        return cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    def encode(self, img, dpi=None):
+        """
+        Encodes an image for the PDF
+        Args:
+            img: BGR or grayscale OpenCV image
+            dpi: resolution of the image, if known
+        Returns:
+            dict of the encoded "data", its "width" and "height", its PDF "filter", "color_space",
+            "bits_per_component" and "decode_parms" (None when the filter takes no parameters)
+        """
+        img = self._resized(img, dpi)
+        color_mode = self._color_mode_of(img)
+        if color_mode != "color" and len(img.shape) == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        if color_mode == "bilevel":
+            encoded = self._encode_ccitt(img)
+            if encoded is not None:
+                return encoded
+        return self._encode_jpeg(img)
+
+    def _encode_jpeg(self, img):
+        parameters = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        if len(img.shape) == 3:
+            parameters += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, JPEG_SAMPLING_FACTORS[self.jpeg_subsampling]]
+        ok, jpeg = cv2.imencode(".jpg", img, parameters)
+        if not ok:
+            raise ValueError("Failed to encode the corrected image as JPEG")
+        height, width = img.shape[:2]
+        return {
+            "data": jpeg.tobytes(),
+            "width": width,
+            "height": height,
+            "filter": "/DCTDecode",
+            "color_space": "/DeviceRGB" if len(img.shape) == 3 else "/DeviceGray",
+            "bits_per_component": 8,
+            "decode_parms": None,
+        }
+
+    @staticmethod
+    def _encode_ccitt(gray):
+        """Encodes a grayscale image, binarized with Otsu's threshold, as CCITT G4. None if libtiff fails"""
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        height, width = binary.shape
+        tiff = BytesIO()
+        # The G4 data must be a single strip to be embedded as is
+        PILImage.fromarray(binary).convert("1").save(tiff, "TIFF", compression="group4",
+                                                     strip_size=math.ceil(width / 8) * height)
+        with PILImage.open(tiff) as saved:
+            offsets, byte_counts = saved.tag_v2.get(STRIP_OFFSETS), saved.tag_v2.get(STRIP_BYTE_COUNTS)
+        if not offsets or len(offsets) != 1:
+            return None
+        data = tiff.getvalue()[offsets[0]:offsets[0] + byte_counts[0]]
+        return {
+            "data": data,
+            "width": width,
+            "height": height,
+            "filter": "/CCITTFaxDecode",
+            "color_space": "/DeviceGray",
+            "bits_per_component": 1,
+            # The G4 data written by libtiff codes black pixels as 1
+            "decode_parms": {"/K": -1, "/Columns": width, "/Rows": height, "/BlackIs1": True},
+        }
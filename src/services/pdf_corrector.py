@@ -1,11 +1,20 @@
+import logging
+import weakref
 import cv2
 import numpy as np
 from io import BytesIO
-from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2 import PageObject, PdfReader, PdfWriter, Transformation
+from PyPDF2.generic import (BooleanObject, DecodedStreamObject, DictionaryObject, NameObject, NumberObject,
+                            RectangleObject)
 from PIL import Image as PILImage
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.utils import ImageReader
+from models.stagetimer import StageTimer
+from services import jpegtran
+from services.outputprofile import OutputProfile
+
+logger = logging.getLogger(__name__)
 
 
 class PDFCorrector:
@@ -13,6 +22,44 @@ class PDFCorrector:
     Class to correct orientation and skew in PDF files
     """
 
+    ENGINES = ("reportlab", "direct")
+
+    def __init__(self, rotate_pages=False, skew_tolerance=0.1, vector_skew=False, engine="reportlab", timer=None,
+                 lossless_jpeg=False, output_profile=None, pass_through=False):
+        """
+        Args:
+            rotate_pages: when True, pages that only need a quarter turn are copied from the source
+                          document with their /Rotate entry adjusted instead of being re-rendered
+            skew_tolerance: skew angle, in degrees, below which a page is considered not skewed
+            vector_skew: when True, skewed pages are copied from the source document and deskewed
+                         with a transformation matrix wrapped around their content stream, the
+                         embedded images are reused unchanged
+            engine: how corrected images are turned into pages. "reportlab" renders a one-page PDF
+                    per image and reads it back, "direct" embeds the image straight into the
+                    output document
+            timer: optional StageTimer collecting the time spent correcting the images ("correction")
+                   and assembling and writing the PDF ("writing")
+            lossless_jpeg: when True, JPEG images that are not skewed are rotated in the DCT domain
+                           with jpegtran and embedded without being decoded and re-encoded. Without
+                           jpegtran, only the images that need no rotation are embedded as is
+            output_profile: OutputProfile the corrected images are encoded with. The images are then
+                            embedded directly whatever the engine. None keeps the encoding of the engine
+            pass_through: when True, pages that need neither rotation nor deskewing are copied from the
+                          source document unchanged, with their original size and images
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown PDF assembly engine '{engine}', expected one of {self.ENGINES}")
+        self.rotate_pages = rotate_pages
+        self.skew_tolerance = skew_tolerance
+        self.vector_skew = vector_skew
+        self.engine = engine
+        self.timer = timer if timer is not None else StageTimer()
+        self.lossless_jpeg = lossless_jpeg
+        self.output_profile = output_profile
+        self.pass_through = pass_through
+        # Number of pages copied from the source document instead of being re-rendered
+        self.copied_pages = 0
+
     def correct_pdf(self, pdf_file, output_stream):
         """
         Takes a PDFFile object with predicted orientation and skew,
@@ -21,34 +68,139 @@ class PDFCorrector:
             pdf_file: PDFFile object with predicted orientation and skew
             output_stream: BytesIO or file-like object to write the corrected PDF to
         """
+        self.correct_pages(pdf_file.pages, output_stream, pdf_file.source)
+
+    def correct_pages(self, pages, output_stream, source=None):
+        """
+        Corrects the images of the given pages and writes a new PDF to the output_stream.
+        Pages are consumed one at a time, so a generator can be given to keep a single
+        decoded page in memory.
+        Args:
+            pages: iterable of Page objects with predicted orientation and skew
+            output_stream: BytesIO or file-like object to write the corrected PDF to
+            source: the original PDF (bytes, path or file-like object), required to copy pages
+                    from the source document
+        """
         # Create a new PDF writer
         pdf_writer = PdfWriter()
+        source_reader = None
+        # Images drawn on several pages are corrected and embedded once: the image XObjects embedded
+        # directly are reused, the pages rendered by reportlab share the resources of the first one
+        embedded = weakref.WeakKeyDictionary()
+        rendered = weakref.WeakKeyDictionary()
 
         # Process each page
-        for page in pdf_file._PDFFile__pages:  # Access private member
+        for page in pages:
+            self.timer.add_page(page)
+            transform = self._page_transform(page)
+            if transform is not None and source is not None:
+                with self.timer.stage("writing"):
+                    if source_reader is None:
+                        source_reader = PdfReader(BytesIO(source) if isinstance(source, bytes) else source)
+                    self._add_transformed_page(pdf_writer, source_reader.pages[page.page_number - 1], *transform)
+                self.copied_pages += 1
+                continue
+
             # Create a new page for each corrected image
             for i, image in enumerate(page.images):
-                # Get the orientation and skew angle
-                orientation = image._Image__orientation  # Access private member
-                skew_angle = image._Image__skew_orientation  # Access private member
+                if image in embedded or image in rendered:
+                    with self.timer.stage("writing"):
+                        if image in embedded:
+                            self._add_xobject_page(pdf_writer, embedded[image])
+                        else:
+                            self._add_shared_page(pdf_writer, rendered[image])
+                    continue
 
-                # Get the raw image data
-                raw_img = image._Image__raw_data  # Access private member
+                # Rotate JPEG images that don't need deskewing without decoding them
+                with self.timer.stage("correction"):
+                    jpeg = self._rotated_jpeg(image)
+                if jpeg is not None:
+                    with self.timer.stage("writing"):
+                        embedded[image] = self._add_encoded_page(pdf_writer, jpeg)
+                    continue
 
                 # Correct the image
-                corrected_img = self._correct_image(raw_img, orientation, skew_angle)
+                with self.timer.stage("correction"):
+                    try:
+                        raw_data = image.raw_data
+                    except ValueError as e:
+                        # Lazily decoded images may turn out to be corrupt, they are skipped like the loader
+                        # skips the images it can't decode
+                        logger.warning(f"Skipping an image of page {page.page_number}: {str(e)}")
+                        continue
+                    corrected_img = self._correct_image(raw_data, image.orientation, image.skew_angle)
+
+                with self.timer.stage("writing"):
+                    if self.engine == "direct" or self.output_profile is not None:
+                        embedded[image] = self._add_image_page(pdf_writer, corrected_img, image.dpi)
+                        continue
 
-                # Convert the corrected image to a PDF page
-                img_pdf_bytes = self._image_to_pdf(corrected_img)
+                    # Convert the corrected image to a PDF page
+                    img_pdf_bytes = self._image_to_pdf(corrected_img)
 
-                # Read the image PDF and add it to the output PDF
-                img_pdf_reader = PdfReader(BytesIO(img_pdf_bytes))
-                pdf_writer.add_page(img_pdf_reader.pages[0])
+                    # Read the image PDF and add it to the output PDF
+                    img_pdf_reader = PdfReader(BytesIO(img_pdf_bytes))
+                    rendered[image] = pdf_writer.add_page(img_pdf_reader.pages[0])
 
         # Write the final PDF to the output stream
-        pdf_writer.write(output_stream)
+        with self.timer.stage("writing"):
+            pdf_writer.write(output_stream)
         output_stream.seek(0)
 
+    def _page_transform(self, page):
+        """
+        Returns the (orientation, skew_angle) to apply to the source page when the page can be
+        corrected without re-rendering its images, None otherwise.
+        All the images of the page must share the same correction.
+        """
+        if not page.images:
+            return None
+        orientations = {image.orientation for image in page.images}
+        if len(orientations) != 1:
+            return None
+        orientation = orientations.pop()
+        skew_angles = [image.skew_angle for image in page.images]
+        if max(skew_angles) - min(skew_angles) > self.skew_tolerance:
+            return None
+        skew_angle = float(np.median(skew_angles))
+
+        if abs(skew_angle) <= self.skew_tolerance:
+            if self.pass_through and orientation == 0:
+                return 0, 0
+            if self.rotate_pages and orientation in (90, 180, 270):
+                return orientation, 0
+            return None
+        if self.vector_skew:
+            return orientation, skew_angle
+        return None
+
+    def _add_transformed_page(self, pdf_writer, source_page, orientation, skew_angle):
+        """
+        Copies a page of the source document, deskews its content with a rotation around the
+        center of the page and sets its /Rotate entry so that it is displayed rotated by
+        -orientation degrees. The images are expected to be drawn upright on the page, which is
+        the case for scanned documents.
+        """
+        new_page = pdf_writer.add_page(source_page)
+        if skew_angle != 0:
+            box = new_page.mediabox
+            left, bottom = float(box.left), float(box.bottom)
+            right, top = float(box.right), float(box.top)
+            cx, cy = (left + right) / 2, (bottom + top) / 2
+            new_page.add_transformation(Transformation().translate(-cx, -cy).rotate(skew_angle).translate(cx, cy))
+            # The wrapped content is stored inline, streams must be indirect objects for viewers to draw them
+            new_page[NameObject("/Contents")] = pdf_writer._add_object(new_page["/Contents"])
+
+            # Grow the page so that the rotated content is not clipped
+            rad = np.deg2rad(skew_angle)
+            cos, sin = abs(np.cos(rad)), abs(np.sin(rad))
+            half_w = ((right - left) * cos + (top - bottom) * sin) / 2
+            half_h = ((right - left) * sin + (top - bottom) * cos) / 2
+            new_box = RectangleObject([cx - half_w, cy - half_h, cx + half_w, cy + half_h])
+            new_page.mediabox = new_box
+            new_page.cropbox = new_box
+        new_page[NameObject("/Rotate")] = NumberObject((360 - orientation) % 360)
+
     def _correct_image(self, img, orientation, skew_angle):
         """
         Corrects the orientation and skew of an image
@@ -92,6 +244,122 @@ class PDFCorrector:
 
         return img
 
+    @staticmethod
+    def _encoded_jpeg(stream, info):
+        width, height, components = info
+        return {
+            "data": stream,
+            "width": width,
+            "height": height,
+            "filter": "/DCTDecode",
+            "color_space": "/DeviceRGB" if components == 3 else "/DeviceGray",
+            "bits_per_component": 8,
+            "decode_parms": None,
+        }
+
+    def _rotated_jpeg(self, image):
+        """
+        Returns the JPEG stream of the image turned upright in the DCT domain, encoded like
+        OutputProfile.encode, None when the image is skewed, is not a grayscale or RGB JPEG or
+        cannot be rotated losslessly
+        """
+        if not self.lossless_jpeg or image.stream is None or abs(image.skew_angle) > self.skew_tolerance:
+            return None
+        info = jpegtran.jpeg_info(image.stream)
+        if info is None or info[2] not in (1, 3):
+            return None
+        if image.orientation == 0:
+            return self._encoded_jpeg(image.stream, info)
+        # Turning the image counter-clockwise by its orientation
+        stream = jpegtran.rotate(image.stream, (360 - image.orientation) % 360)
+        if stream is None:
+            return None
+        info = jpegtran.jpeg_info(stream)
+        if info is None:
+            return None
+        return self._encoded_jpeg(stream, info)
+
+    def _add_image_page(self, pdf_writer, img, dpi=None, page_size=A4):
+        """
+        Adds a page holding the image, fitted and centered like _image_to_pdf, directly to the
+        writer: the image is encoded with the output profile, JPEG at quality 75 by default, and
+        embedded as an image XObject without any intermediate PDF
+        Returns:
+            the image XObject, see _image_xobject
+        """
+        output_profile = self.output_profile if self.output_profile is not None else OutputProfile()
+        return self._add_encoded_page(pdf_writer, output_profile.encode(img, dpi), page_size)
+
+    def _add_encoded_page(self, pdf_writer, encoded, page_size=A4):
+        """
+        Adds a page holding an image encoded like OutputProfile.encode, fitted and centered on the page
+        Returns:
+            the image XObject, see _image_xobject
+        """
+        xobject = self._image_xobject(pdf_writer, encoded)
+        self._add_xobject_page(pdf_writer, xobject, page_size)
+        return xobject
+
+    @staticmethod
+    def _image_xobject(pdf_writer, encoded):
+        """
+        Adds an image encoded like OutputProfile.encode to the writer as an image XObject
+        Returns:
+            (reference to the XObject, width, height of the image)
+        """
+        img_width, img_height = encoded["width"], encoded["height"]
+
+        image_stream = DecodedStreamObject()
+        image_stream.set_data(encoded["data"])
+        image_stream.update({
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Image"),
+            NameObject("/Width"): NumberObject(img_width),
+            NameObject("/Height"): NumberObject(img_height),
+            NameObject("/ColorSpace"): NameObject(encoded["color_space"]),
+            NameObject("/BitsPerComponent"): NumberObject(encoded["bits_per_component"]),
+            NameObject("/Filter"): NameObject(encoded["filter"]),
+        })
+        if encoded["decode_parms"] is not None:
+            image_stream[NameObject("/DecodeParms")] = DictionaryObject({
+                NameObject(key): BooleanObject(value) if isinstance(value, bool) else NumberObject(value)
+                for key, value in encoded["decode_parms"].items()
+            })
+        return pdf_writer._add_object(image_stream), img_width, img_height
+
+    @staticmethod
+    def _add_xobject_page(pdf_writer, xobject, page_size=A4):
+        """Adds a page drawing an image XObject returned by _image_xobject, fitted and centered on the page"""
+        image_ref, img_width, img_height = xobject
+        page_width, page_height = page_size
+        aspect = img_height / img_width
+        draw_width = page_width
+        draw_height = draw_width * aspect
+        if draw_height > page_height:
+            draw_height = page_height
+            draw_width = draw_height / aspect
+        x = (page_width - draw_width) / 2
+        y = (page_height - draw_height) / 2
+
+        content_stream = DecodedStreamObject()
+        content_stream.set_data(f"q {draw_width:.4f} 0 0 {draw_height:.4f} {x:.4f} {y:.4f} cm /Im0 Do Q".encode())
+
+        page = pdf_writer.add_page(PageObject.create_blank_page(None, page_width, page_height))
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/XObject"): DictionaryObject({
+                NameObject("/Im0"): image_ref,
+            }),
+        })
+        page[NameObject("/Contents")] = pdf_writer._add_object(content_stream)
+
+    @staticmethod
+    def _add_shared_page(pdf_writer, page):
+        """Adds a page drawing the same content as a page of the writer, sharing its content and resources"""
+        shared_page = pdf_writer.add_page(PageObject.create_blank_page(None, page.mediabox.width,
+                                                                       page.mediabox.height))
+        shared_page[NameObject("/Resources")] = page["/Resources"]
+        shared_page[NameObject("/Contents")] = page.raw_get("/Contents")
+
     def _image_to_pdf(self, img, page_size=A4):
         if len(img.shape) == 3 and img.shape[2] == 3:
             img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
@@ -0,0 +1,78 @@
+import cv2
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+from io import BytesIO
+from interfaces.pdffileloader import PDFFileLoader
+
+# Conversions of the pdfium bitmap modes to the BGR images returned by cv2.imdecode
+BITMAP_CONVERSIONS = {
+    "L": cv2.COLOR_GRAY2BGR,
+    "BGRA": cv2.COLOR_BGRA2BGR,
+    "BGRX": cv2.COLOR_BGRA2BGR,
+}
+
+
+class PDFiumLoader(PDFFileLoader):
+    """
+    Reads the image XObjects of each page straight from the document with pdfium, without the layout
+    analysis pdfplumber runs on every page. JPEG streams are decoded with OpenCV, every other filter
+    (Flate, CCITT fax, JBIG2, JPEG 2000, ...) is decoded by pdfium.
+    Only JPEG images follow the decode policy, the others are always decoded while the document is open.
+    """
+
+    def _image(self, image_object, stream, dpi):
+        """Describes the image as the keyword arguments of an Image, None if it can't be decoded"""
+        if image_object.get_filters() == ["DCTDecode"]:
+            img = self.encoded_image(stream, dpi, image_object.get_size())
+            if img is not None:
+                return img
+        img = self._decode_bitmap(image_object)
+        return {"raw_data": self.held(img), "stream": stream, "dpi": dpi}
+
+    @staticmethod
+    def _decode_bitmap(image_object):
+        """Decodes the image with pdfium as a BGR array"""
+        bitmap = image_object.get_bitmap(render=False)
+        try:
+            img = bitmap.to_numpy()
+            if bitmap.mode in BITMAP_CONVERSIONS:
+                return cv2.cvtColor(img, BITMAP_CONVERSIONS[bitmap.mode])
+            # The array is a view on the pdfium buffer, which is released with the bitmap
+            return img.copy()
+        finally:
+            bitmap.close()
+
+    def iter_pages(self, filename):
+        found = False
+        distinct = {}
+        pdf = pdfium.PdfDocument(filename)
+        try:
+            for page_index in range(len(pdf)):
+                page = pdf[page_index]
+                images = []
+                for image_object in page.get_objects(filter=(pdfium_c.FPDF_PAGEOBJ_IMAGE,)):
+                    try:
+                        stream = bytes(image_object.get_data(decode_simple=False))
+                        dpi = image_object.get_metadata().horizontal_dpi
+                        dpi = dpi if dpi > 0 else None
+                        images.append(self.distinct_image(
+                            distinct, stream, dpi, lambda: self._image(image_object, stream, dpi),
+                        ))
+                    except Exception as e:
+                        print(f"Error decoding image on page {page_index + 1}: {str(e)}")
+                        continue
+                rotation = page.get_rotation()
+                page.close()
+                if images:  # Only yield the page if there are valid images
+                    found = True
+                    yield {"page_number": page_index + 1, "rotation": rotation, "images": images}
+        finally:
+            pdf.close()
+        if not found:
+            raise ValueError("The PDF file does not contain any valid images.")
+
+    def process(self, filename):
+        return list(self.iter_pages(filename))
+
+    def processBytes(self, pdf_data: bytes):
+        return self.process(BytesIO(pdf_data))
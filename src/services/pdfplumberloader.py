@@ -1,22 +1,33 @@
 import pdfplumber
-import cv2
-import numpy as np
 from io import BytesIO
 from interfaces.pdffileloader import PDFFileLoader
 
 
 class PDFPlumberLoader(PDFFileLoader):
 
-    def process(self, filename):
-        pages = []
+    @staticmethod
+    def _dpi(image_file_object):
+        """Horizontal resolution of the image as drawn on the page, None if unknown"""
+        width_in_inches = image_file_object["width"] / 72
+        if width_in_inches <= 0:
+            return None
+        return image_file_object["srcsize"][0] / width_in_inches
+
+    def iter_pages(self, filename):
+        found = False
+        distinct = {}
         with pdfplumber.open(filename) as pdf:
             for page in pdf.pages:
                 if len(page.images) > 0:
                     images = []
                     for image_file_object in page.images:
                         try:
-                            nparr = np.fromstring(image_file_object["stream"].get_rawdata(), np.uint8)
-                            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                            stream = image_file_object["stream"].get_rawdata()
+                            dpi = self._dpi(image_file_object)
+                            img = self.distinct_image(
+                                distinct, stream, dpi,
+                                lambda: self.encoded_image(stream, dpi, tuple(image_file_object["srcsize"])),
+                            )
                             if img is None:
                                 print(f"Warning: Failed to decode image on page {page.page_number}")
                                 continue  # Skip invalid images
@@ -24,12 +35,16 @@ class PDFPlumberLoader(PDFFileLoader):
                         except Exception as e:
                             print(f"Error decoding image on page {page.page_number}: {str(e)}")
                             continue
-                    if images:  # Only add the page if there are valid images
-                        pages.append({"page_number": page.page_number, "rotation": page.rotation, "images": images})
-            pdf.close()
-        if not pages:
+                    if images:  # Only yield the page if there are valid images
+                        found = True
+                        yield {"page_number": page.page_number, "rotation": page.rotation, "images": images}
+                # Drop the parsed objects of the page, they are not needed anymore
+                page.close()
+        if not found:
             raise ValueError("The PDF file does not contain any valid images.")
-        return pages
+
+    def process(self, filename):
+        return list(self.iter_pages(filename))
 
     def processBytes(self, pdf_data: bytes):
         return self.process(BytesIO(pdf_data))
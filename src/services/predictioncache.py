@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    Cache of orientation and skew predictions, with a bounded in-memory LRU tier and an optional
+    on-disk tier that survives restarts. Values must be JSON serializable.
+    """
+
+    def __init__(self, max_entries=1024, directory=None):
+        """
+        Args:
+            max_entries: maximum number of predictions kept in memory
+            directory: directory of the on-disk tier, None to keep the predictions in memory only
+        """
+        self.max_entries = max_entries
+        self.directory = directory
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def hits(self) -> int:
+        return self.__hits
+
+    @property
+    def misses(self) -> int:
+        return self.__misses
+
+    def stats(self):
+        return {"hits": self.__hits, "misses": self.__misses, "entries": len(self.__entries)}
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """Returns the cached value of the key, None if it is not cached"""
+        with self.__lock:
+            if key in self.__entries:
+                self.__entries.move_to_end(key)
+                self.__hits += 1
+                return self.__entries[key]
+
+        value = None
+        if self.directory:
+            try:
+                with open(self._path(key)) as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                value = None
+
+        with self.__lock:
+            if value is None:
+                self.__misses += 1
+                return None
+            self.__hits += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        with self.__lock:
+            self._remember(key, value)
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so that readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "w") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+
+    def _remember(self, key, value):
+        self.__entries[key] = value
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.max_entries:
+            self.__entries.popitem(last=False)
@@ -0,0 +1,66 @@
+import numpy as np
+
+from interfaces.skewpredictor import SkewPredictor
+from models.imageanalysis import ImageAnalysis
+
+
+class ProjectionSkewPredictor(SkewPredictor):
+    """
+    Skew predictor searching the angle at which the rows of a downscaled binary image have the most
+    contrasted projection profile, coarse to fine. The ink pixels are sheared rather than the image
+    rotated, and the profiles of every angle of a search level are counted at once, so that the cost
+    only depends on the size the image is reduced to and the number of ink pixels kept.
+    """
+    accepts_analysis = True
+
+    def __init__(self, size=1000, max_skew=10, steps=(1.0, 0.2, 0.05), max_points=100000, analysis_dpi=None):
+        """
+        Args:
+            size: length, in pixels, the longest side of the image is reduced to
+            max_skew: largest skew angle, in degrees, searched
+            steps: step, in degrees, of each search level. The first level sweeps the whole range, the
+                   following ones search around the best angle of the previous level
+            max_points: number of ink pixels the profiles are counted on at most, evenly sampled
+            analysis_dpi: resolution of the grayscale analysis image the predictor receives, None to
+                          receive the full resolution image
+        """
+        self.size = size
+        self.max_skew = max_skew
+        self.steps = steps
+        self.max_points = max_points
+        self.analysis_dpi = analysis_dpi
+
+    def cache_key(self):
+        return (f"{type(self).__name__}:{self.analysis_dpi}:{self.size}:{self.max_skew}:"
+                f"{','.join(map(str, self.steps))}:{self.max_points}")
+
+    @staticmethod
+    def _best_angle(ys, xs, height, angles):
+        """The angle whose sheared row profile has the largest sum of squares"""
+        slopes = np.tan(np.radians(angles))
+        # Rows of the sheared ink pixels, shifted so that they are all positive
+        shift = int(np.ceil(xs.max(initial=0) * np.abs(slopes).max())) + 1
+        bins = height + 2 * shift
+        rows = np.rint(ys[None, :] - xs[None, :] * slopes[:, None]).astype(np.int64) + shift
+        rows += np.arange(len(angles))[:, None] * bins
+        profiles = np.bincount(rows.ravel(), minlength=len(angles) * bins).reshape(len(angles), bins)
+        scores = np.square(profiles, dtype=np.float64).sum(axis=1)
+        return float(angles[np.argmax(scores)])
+
+    def process(self, raw_img):
+        if raw_img is None:
+            raise ValueError("Input image is None; cannot process skew prediction.")
+        binary = ImageAnalysis.of(raw_img).reduced_binary(self.size)
+        ink = np.flatnonzero(binary)
+        if ink.size == 0:
+            return 0
+        ink = ink[::-(-ink.size // self.max_points)]
+        ys, xs = np.divmod(ink, binary.shape[1])
+        ys, xs = ys.astype(np.float64), xs.astype(np.float64)
+
+        angle, half_range = 0.0, self.max_skew
+        for step in self.steps:
+            angles = np.arange(angle - half_range, angle + half_range + step / 2, step)
+            angle = self._best_angle(ys, xs, binary.shape[0], angles)
+            half_range = step
+        return angle
@@ -2,13 +2,25 @@ import pytesseract
 from pytesseract import Output
 
 from interfaces.orientationpredictor import OrientationPredictor
+from models.imageanalysis import ImageAnalysis
 
 
 class TesseractOrientationPredictor(OrientationPredictor):
+    accepts_analysis = True
+
+    def __init__(self, analysis_dpi=None):
+        """
+        Args:
+            analysis_dpi: resolution of the grayscale analysis image to run OSD on, None to run
+                          it on the full resolution image
+        """
+        self.analysis_dpi = analysis_dpi
 
     def process(self, raw_img):
-        osd_result = pytesseract.image_to_osd(raw_img, output_type=Output.DICT)
+        # Tesseract works on grayscale images, which are also smaller to hand over to it
+        osd_result = pytesseract.image_to_osd(ImageAnalysis.of(raw_img).gray, output_type=Output.DICT)
         result = {}
         result["orientation"] = osd_result['orientation']
         result["rotate"] = osd_result['rotate']
+        result["confidence"] = osd_result['orientation_conf']
         return result
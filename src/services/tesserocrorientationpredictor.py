@@ -0,0 +1,81 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image as PILImage
+
+from interfaces.orientationpredictor import OrientationPredictor
+from models.imageanalysis import ImageAnalysis
+
+try:
+    import tesserocr
+except ImportError:  # pragma: no cover
+    tesserocr = None
+
+# Warm engines of the current process, keyed by (lang, pool_size), shared by every predictor instance
+_engine_pools = {}
+_engine_pools_lock = threading.Lock()
+
+
+class TesserocrOrientationPredictor(OrientationPredictor):
+    """
+    Orientation predictor running Tesseract OSD in-process through the tesserocr bindings.
+    The OSD engines are created once per process and reused across images and tasks, instead of
+    starting a tesseract process (and reloading the OSD model) for every image.
+    """
+    accepts_analysis = True
+
+    def __init__(self, pool_size=2, lang="osd", analysis_dpi=None):
+        """
+        Args:
+            pool_size: number of warm OSD engines kept by the process
+            lang: tesseract language data used for OSD
+            analysis_dpi: resolution of the grayscale analysis image to run OSD on, None to run
+                          it on the full resolution image
+        """
+        if tesserocr is None:
+            raise ImportError("The tesserocr package is required by TesserocrOrientationPredictor")
+        self.pool_size = max(1, pool_size)
+        self.lang = lang
+        self.analysis_dpi = analysis_dpi
+
+    def cache_key(self):
+        return f"{type(self).__name__}:{self.analysis_dpi}:{self.lang}"
+
+    def _engine_pool(self):
+        key = (self.lang, self.pool_size)
+        with _engine_pools_lock:
+            if key not in _engine_pools:
+                engines = queue.Queue()
+                for _ in range(self.pool_size):
+                    engines.put(tesserocr.PyTessBaseAPI(lang=self.lang, psm=tesserocr.PSM.OSD_ONLY))
+                _engine_pools[key] = engines
+            return _engine_pools[key]
+
+    def process(self, raw_img):
+        if raw_img is None:
+            raise ValueError("Input image is None; cannot process orientation prediction.")
+        pil_img = PILImage.fromarray(ImageAnalysis.of(raw_img).gray)
+
+        engines = self._engine_pool()
+        engine = engines.get()
+        try:
+            engine.SetImage(pil_img)
+            osd_result = engine.DetectOrientationScript()
+            engine.Clear()
+        finally:
+            engines.put(engine)
+
+        if not osd_result:
+            raise ValueError("Tesseract OSD could not detect the orientation of the image.")
+        result = {}
+        result["orientation"] = osd_result["orient_deg"]
+        result["rotate"] = (360 - osd_result["orient_deg"]) % 360
+        result["confidence"] = osd_result["orient_conf"]
+        return result
+
+    def process_batch(self, raw_imgs, executor=None):
+        # The engines release the GIL, a thread per engine keeps them all busy
+        if executor is None and self.pool_size > 1:
+            with ThreadPoolExecutor(max_workers=self.pool_size) as pool:
+                return list(pool.map(self.process, raw_imgs))
+        return super().process_batch(raw_imgs, executor)
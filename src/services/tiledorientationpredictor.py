@@ -0,0 +1,109 @@
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+
+from interfaces.orientationpredictor import OrientationPredictor
+from models.imageanalysis import ImageAnalysis
+
+
+class TiledOrientationPredictor(OrientationPredictor):
+    """
+    Runs an orientation engine, e.g. Tesseract OSD, on a few text dense tiles of the image instead of the
+    whole image. The tiles are picked from an ink density map, run concurrently and combined with a vote
+    weighted by the confidence of the engine. The vote stops as soon as one orientation holds a majority
+    of the tiles. Images without any text dense tile are sent whole to the engine.
+    """
+    accepts_analysis = True
+
+    def __init__(self, engine: OrientationPredictor, max_tiles=5, tile_size=1000, min_density=0.02,
+                 max_density=0.35):
+        """
+        Args:
+            engine: orientation predictor run on the tiles, returning a "confidence" along with its prediction
+            max_tiles: number of tiles run at most. Half of them plus one run concurrently, which is enough
+                       to reach a majority when they agree
+            tile_size: side, in pixels of the image the engine receives, of the tiles the image is split into
+            min_density: share of ink pixels from which a tile is considered to hold text
+            max_density: share of ink pixels above which a tile is considered to hold a picture or a border
+        """
+        self.engine = engine
+        self.max_tiles = max_tiles
+        self.tile_size = tile_size
+        self.min_density = min_density
+        self.max_density = max_density
+        # The tiles are cut from the input of the engine
+        self.analysis_dpi = engine.analysis_dpi
+
+    def cache_key(self):
+        return (f"{type(self).__name__}:{self.engine.cache_key()}:{self.max_tiles}:{self.tile_size}:"
+                f"{self.min_density}:{self.max_density}")
+
+    def tiles(self, analysis):
+        """The (top, bottom, left, right) bounds of the text dense tiles of the image, densest first"""
+        binary = analysis.binary
+        height, width = binary.shape
+        row_edges = np.linspace(0, height, max(1, round(height / self.tile_size)) + 1).astype(int)
+        column_edges = np.linspace(0, width, max(1, round(width / self.tile_size)) + 1).astype(int)
+        ink = np.add.reduceat(np.add.reduceat(binary, row_edges[:-1], axis=0, dtype=np.int64),
+                              column_edges[:-1], axis=1)
+        areas = np.outer(np.diff(row_edges), np.diff(column_edges))
+        density = ink / areas
+
+        tiles = []
+        for index in np.argsort(density, axis=None)[::-1]:
+            row, column = np.unravel_index(index, density.shape)
+            if self.min_density <= density[row, column] <= self.max_density:
+                tiles.append((row_edges[row], row_edges[row + 1], column_edges[column], column_edges[column + 1]))
+            if len(tiles) == self.max_tiles:
+                break
+        return tiles
+
+    def _tile_input(self, analysis, bounds):
+        top, bottom, left, right = bounds
+        tile = np.ascontiguousarray(analysis.gray[top:bottom, left:right])
+        return ImageAnalysis(tile, analysis.dpi) if self.engine.accepts_analysis else tile
+
+    def _tile_result(self, tile):
+        """The prediction of the engine on a tile, None when the engine fails, e.g. on too little text"""
+        try:
+            return self.engine.process(tile)
+        except Exception:
+            return None
+
+    def process(self, raw_img):
+        analysis = ImageAnalysis.of(raw_img)
+        tiles = self.tiles(analysis)
+        if len(tiles) < 2:
+            return self.engine.process(raw_img if self.engine.accepts_analysis else analysis.image)
+
+        quorum = len(tiles) // 2 + 1
+        votes = defaultdict(int)
+        weights = defaultdict(float)
+        confidences = defaultdict(list)
+        pool = ThreadPoolExecutor(max_workers=quorum)
+        try:
+            pending = {pool.submit(self._tile_result, self._tile_input(analysis, bounds)) for bounds in tiles}
+            while pending and max(votes.values(), default=0) < quorum:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    if result is None:
+                        continue
+                    orientation = result["orientation"]
+                    confidence = result.get("confidence")
+                    votes[orientation] += 1
+                    weights[orientation] += max(confidence, 0.0) if confidence is not None else 1.0
+                    confidences[orientation].append(confidence if confidence is not None else 1.0)
+        finally:
+            # The tiles not started yet are dropped, the running ones end in the background
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        if not votes:
+            return self.engine.process(raw_img if self.engine.accepts_analysis else analysis.image)
+        orientation = max(votes, key=lambda candidate: (weights[candidate], votes[candidate]))
+        return {
+            "orientation": orientation,
+            "rotate": (360 - orientation) % 360,
+            # Confidence of the engine on the winning tiles, scaled by their share of the votes
+            "confidence": float(np.mean(confidences[orientation])) * votes[orientation] / sum(votes.values()),
+        }
@@ -0,0 +1,75 @@
+import time
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from admission import TaskAdmission, install_admission
+
+
+def make_app(admission, rejected):
+    app = FastAPI()
+
+    @app.post("/compute")
+    async def compute(fail: bool = False):
+        # Stands for the tasks service, which queues the task and answers right away
+        if fail:
+            raise HTTPException(status_code=500)
+        return {"queued": True}
+
+    install_admission(app, lambda: admission, on_reject=lambda: rejected.append(1))
+    return app
+
+
+def test_full_queue_answers_503():
+    admission = TaskAdmission(capacity=2)
+    rejected = []
+    client = TestClient(make_app(admission, rejected))
+
+    assert [client.post("/compute").status_code for _ in range(2)] == [200, 200]
+    response = client.post("/compute")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert admission.admitted == 2 and rejected == [1]
+
+    # A processed task frees its slot
+    admission.release()
+    assert client.post("/compute").status_code == 200
+
+
+def test_refused_tasks_are_released():
+    admission = TaskAdmission(capacity=1)
+    client = TestClient(make_app(admission, []), raise_server_exceptions=False)
+
+    assert client.post("/compute", params={"fail": True}).status_code == 500
+    assert admission.admitted == 0
+    assert client.post("/compute").status_code == 200
+
+
+def test_other_routes_are_not_admitted():
+    admission = TaskAdmission(capacity=0)
+    client = TestClient(make_app(admission, []))
+
+    assert client.get("/docs").status_code == 200
+    assert admission.admitted == 0
+
+
+def test_expired_tasks_free_their_slot():
+    admission = TaskAdmission(capacity=1, lease_seconds=0.05)
+    assert admission.try_admit() is not None
+    assert admission.try_admit() is None and admission.saturated
+
+    time.sleep(0.1)
+    assert admission.try_admit() is not None
+
+
+def test_late_tasks_release_their_own_lease():
+    admission = TaskAdmission(capacity=3, lease_seconds=0.2)
+    admission.try_admit()
+    time.sleep(0.25)
+    admission.try_admit()
+    admission.try_admit()
+    assert admission.admitted == 2
+
+    # The task whose lease expired is processed first and releases its own lease, not one of a waiting task
+    admission.release()
+    assert admission.admitted == 2
+    admission.release()
+    assert admission.admitted == 1
@@ -0,0 +1,50 @@
+import numpy as np
+from benchmarks.synthetic import make_page
+from interfaces.orientationpredictor import OrientationPredictor
+from models.image import Image, predict_orientations
+from services.cascadeorientationpredictor import CascadeOrientationPredictor
+from services.projectionorientationpredictor import ProjectionOrientationPredictor
+
+
+class FixedOrientationPredictor(OrientationPredictor):
+    def __init__(self, orientation, confidence):
+        self.orientation = orientation
+        self.confidence = confidence
+        self.calls = 0
+
+    def process(self, raw_img):
+        self.calls += 1
+        return {"orientation": self.orientation, "rotate": (360 - self.orientation) % 360,
+                "confidence": self.confidence}
+
+
+def test_projection_finds_the_direction_of_the_lines():
+    predictor = ProjectionOrientationPredictor()
+    for seed, (orientation, skew_angle) in enumerate([(0, 2.0), (90, -3.0), (180, 0.5), (270, 4.0)]):
+        result = predictor.process(make_page(orientation, skew_angle, dpi=150, seed=seed))
+        assert (result["orientation"] in (90, 270)) == (orientation in (90, 270))
+        assert 0 <= result["confidence"] <= 1
+        if result["confidence"] >= 0.5:
+            assert result["orientation"] == orientation
+
+
+def test_projection_is_unsure_without_text():
+    result = ProjectionOrientationPredictor().process(np.full((400, 300, 3), 255, dtype=np.uint8))
+    assert result["confidence"] == 0
+
+
+def test_cascade_only_defers_unsure_images():
+    images = [Image(np.full((4, 4), value, dtype=np.uint8)) for value in range(3)]
+    fallback = FixedOrientationPredictor(180, 12.5)
+
+    cascade = CascadeOrientationPredictor(FixedOrientationPredictor(90, 0.8), fallback, threshold=0.5)
+    predict_orientations(images, cascade)
+    assert [image.orientation for image in images] == [90, 90, 90]
+    assert images[0].orientation_confidence == 0.8
+    assert fallback.calls == 0 and cascade.decided == 3
+
+    cascade = CascadeOrientationPredictor(FixedOrientationPredictor(90, 0.2), fallback, threshold=0.5)
+    predict_orientations(images, cascade)
+    assert [image.orientation for image in images] == [180, 180, 180]
+    assert images[0].orientation_confidence == 12.5
+    assert fallback.calls == 3 and cascade.deferred == 3
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from benchmarks.synthetic import make_page
+from models.image import Image
+from models.imageanalysis import ImageAnalysis
+from services.cv2skewpredictor import CV2SkewPredictor
+
+
+def test_segment_angles_and_filter():
+    predictor = CV2SkewPredictor()
+    lines = np.array([[[0, 0, 100, 2]], [[0, 0, 0, 100]], [[100, 5, 0, 0]], [[0, 0, 30, -1]]], dtype=np.int32)
+
+    angles = predictor.calculate_anglesP(lines)
+    assert np.allclose(angles, np.degrees(np.arctan2([2, 100, -5, -1], [100, 0, -100, 30])))
+    assert np.allclose(predictor.segment_lengths(lines), np.hypot([100, 0, 100, 30], [2, 100, 5, 1]))
+    # Vertical segments are dropped, the ones drawn from right to left are kept
+    assert np.array_equal(predictor.lines_with_vertical_filterP(lines, 10), lines[[0, 3]])
+    assert predictor.calculate_anglesP(None).size == 0
+
+
+def test_weighted_median():
+    values = np.array([1.0, 2.0, 3.0, 10.0])
+    assert CV2SkewPredictor.weighted_median(values, np.array([1.0, 1.0, 1.0, 10.0])) == 10.0
+    assert CV2SkewPredictor.weighted_median(values, np.array([5.0, 1.0, 1.0, 1.0])) == 1.0
+
+
+@pytest.mark.parametrize("skew_angle", [-2.0, 2.0])
+def test_length_weighted_skew(skew_angle):
+    img = make_page(0, skew_angle, dpi=100)
+    predictor = CV2SkewPredictor(analysis_dpi=100, length_weighted=True)
+
+    assert abs(predictor.process(ImageAnalysis(img, dpi=100)) - skew_angle) < 0.5
+    assert predictor.cache_key() != CV2SkewPredictor(analysis_dpi=100).cache_key()
+
+
+def test_hough_parameters_follow_the_image_resolution():
+    predictor = CV2SkewPredictor(analysis_dpi=300)
+    assert predictor.hough_parameters(150) == (50, 60, 5)
+    # Unknown resolutions keep the parameters of the reference resolution
+    assert predictor.hough_parameters() == predictor.hough_parameters(300) == (100, 120, 10)
+
+    # A 150 dpi image is not upscaled to the analysis resolution
+    image = Image(make_page(0, 0.0, dpi=150), dpi=150)
+    assert image.prediction_analysis(predictor).dpi == 150
+    assert Image(make_page(0, 0.0, dpi=150)).prediction_analysis(predictor).dpi is None
+    assert Image(make_page(0, 0.0, dpi=150), dpi=600).prediction_analysis(predictor).dpi == 300
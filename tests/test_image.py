@@ -0,0 +1,124 @@
+import cv2
+import numpy as np
+import pytest
+from interfaces.skewpredictor import SkewPredictor
+from models.image import Image, predict_images
+from models.imageanalysis import ImageAnalysis
+
+
+class ShapeSkewPredictor(SkewPredictor):
+    def __init__(self, analysis_dpi=None):
+        self.analysis_dpi = analysis_dpi
+
+    def process(self, raw_img):
+        return float(raw_img.shape[1])
+
+
+def make_jpeg_image(width=800, height=1000, dpi=300):
+    raw_data = np.full((height, width, 3), 255, dtype=np.uint8)
+    cv2.putText(raw_data, "Hello", (50, 200), cv2.FONT_HERSHEY_SIMPLEX, 3, (0, 0, 0), 5)
+    ok, stream = cv2.imencode(".jpg", raw_data)
+    return Image(raw_data, stream=stream.tobytes(), dpi=dpi)
+
+
+def test_analysis_image_is_downscaled_grayscale():
+    image = make_jpeg_image()
+    analysis = image.analysis_image(75)
+
+    assert analysis.shape == (250, 200)
+    assert analysis.dtype == np.uint8
+    # The image doesn't hold on to its analysis image once predicted
+    assert analysis is not image.analysis_image(75)
+
+
+def test_analysis_image_never_upscales():
+    image = make_jpeg_image(dpi=100)
+    assert image.analysis_image(150).shape == (1000, 800)
+
+
+def test_analysis_image_without_stream():
+    image = Image(np.zeros((600, 400, 3), dtype=np.uint8), dpi=200)
+    assert image.analysis_image(100).shape == (300, 200)
+
+
+def test_prediction_input():
+    image = make_jpeg_image()
+    image.predict_skew(ShapeSkewPredictor())
+    assert image.skew_angle == 800
+    image.predict_skew(ShapeSkewPredictor(analysis_dpi=150))
+    assert image.skew_angle == 400
+
+
+def test_lazy_image_is_decoded_when_needed():
+    stream = make_jpeg_image().stream
+    image = Image(stream=stream, dpi=300, size=(800, 1000))
+
+    assert image.size == (800, 1000)
+    assert not image.decoded
+    # JPEG streams are decoded straight to the analysis resolution
+    image.predict_skew(ShapeSkewPredictor(analysis_dpi=150))
+    assert image.skew_angle == 400
+    assert not image.decoded
+    assert image.raw_data.shape == (1000, 800, 3)
+    assert image.decoded
+
+
+def test_lazy_image_can_drop_decoded_pixels():
+    image = Image(stream=make_jpeg_image().stream, keep_decoded=False)
+
+    assert image.size == (800, 1000)
+    assert image.raw_data.shape == (1000, 800, 3)
+    assert not image.decoded
+
+
+def test_image_needs_data_or_stream():
+    with pytest.raises(ValueError):
+        Image()
+
+
+class AnalysisRecorder:
+    accepts_analysis = True
+
+    def __init__(self, analysis_dpi=None, result=0.0):
+        self.analysis_dpi = analysis_dpi
+        self.result = result
+        self.inputs = []
+
+    def cache_key(self):
+        return f"AnalysisRecorder:{self.analysis_dpi}"
+
+    def process_batch(self, raw_imgs, executor=None):
+        self.inputs.extend(raw_imgs)
+        for analysis in raw_imgs:
+            analysis.edges
+        return [self.result for _ in raw_imgs]
+
+
+def test_predict_images_shares_the_analysis():
+    images = [make_jpeg_image() for _ in range(3)]
+    orientation_predictor = AnalysisRecorder(analysis_dpi=150, result={"orientation": 90, "rotate": 270})
+    skew_predictor = AnalysisRecorder(analysis_dpi=150, result=1.5)
+    predict_images(images, orientation_predictor, skew_predictor, chunk_size=2)
+
+    assert [image.orientation for image in images] == [90, 90, 90]
+    assert [image.skew_angle for image in images] == [1.5, 1.5, 1.5]
+    assert all(a is b for a, b in zip(orientation_predictor.inputs, skew_predictor.inputs))
+    assert orientation_predictor.inputs[0].shape == (500, 400)
+
+
+def test_predict_images_separates_resolutions():
+    orientation_predictor = AnalysisRecorder(result={"orientation": 0, "rotate": 0})
+    skew_predictor = AnalysisRecorder(analysis_dpi=150)
+    predict_images([make_jpeg_image()], orientation_predictor, skew_predictor)
+
+    assert orientation_predictor.inputs[0].shape == (1000, 800, 3)
+    assert skew_predictor.inputs[0].shape == (500, 400)
+
+
+def test_image_analysis_is_computed_once():
+    analysis = ImageAnalysis(make_jpeg_image().raw_data)
+
+    assert analysis.gray.shape == (1000, 800)
+    assert set(np.unique(analysis.binary)) == {0, 1}
+    assert analysis.edges is analysis.edges
+    assert ImageAnalysis.of(analysis) is analysis
@@ -0,0 +1,38 @@
+import gc
+import cv2
+import numpy as np
+from models.image import Image
+from models.memorybudget import MemoryBudget
+
+
+def test_images_beyond_the_budget_are_spilled():
+    budget = MemoryBudget(1000)
+    first = budget.hold(np.ones((20, 20), dtype=np.uint8))
+    second = budget.hold(np.arange(30 * 40 * 3, dtype=np.uint32).astype(np.uint8).reshape(30, 40, 3))
+
+    assert not isinstance(first, np.memmap)
+    assert isinstance(second, np.memmap)
+    assert (budget.held, budget.spilled, budget.spilled_images) == (400, 3600, 1)
+    assert np.array_equal(second, np.arange(3600, dtype=np.uint32).astype(np.uint8).reshape(30, 40, 3))
+    # Spilled images are used like any other one
+    assert cv2.cvtColor(second, cv2.COLOR_BGR2GRAY).shape == (30, 40)
+
+
+def test_released_images_give_their_memory_back():
+    budget = MemoryBudget(1000)
+    img = budget.hold(np.zeros((30, 30), dtype=np.uint8))
+    assert budget.held == 900
+    del img
+    gc.collect()
+    assert budget.held == 0
+    assert not isinstance(budget.hold(np.zeros((30, 30), dtype=np.uint8)), np.memmap)
+
+
+def test_lazily_decoded_images_are_kept_within_the_budget():
+    _, stream = cv2.imencode(".png", np.full((20, 30, 3), 255, dtype=np.uint8))
+    budget = MemoryBudget(0)
+    image = Image(stream=stream.tobytes(), budget=budget)
+
+    assert isinstance(image.raw_data, np.memmap)
+    assert image.raw_data.shape == (20, 30, 3)
+    assert budget.spilled_images == 1
@@ -0,0 +1,64 @@
+from io import BytesIO
+import cv2
+import numpy as np
+import pypdfium2 as pdfium
+import pytest
+from models.image import Image
+from models.page import Page
+from models.pdffile import PDFFile
+from services.outputprofile import OutputProfile
+from services.pdf_corrector import PDFCorrector
+
+
+def make_text_image(color=False, size=(400, 300)):
+    img = np.full((*size, 3), 255, dtype=np.uint8)
+    for row in range(40, size[0] - 40, 30):
+        cv2.putText(img, "Scanned text line", (20, row), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2)
+    if color:
+        img[:size[0] // 3, :] = (30, 120, 220)
+    return img
+
+
+def test_auto_color_mode():
+    profile = OutputProfile(color_mode="auto")
+
+    assert profile.encode(make_text_image())["filter"] == "/CCITTFaxDecode"
+    gray = cv2.cvtColor(make_text_image(), cv2.COLOR_BGR2GRAY)
+    gray[:100] = 128
+    assert profile.encode(gray)["color_space"] == "/DeviceGray"
+    assert profile.encode(gray)["filter"] == "/DCTDecode"
+    assert profile.encode(make_text_image(color=True))["color_space"] == "/DeviceRGB"
+
+
+def test_downsampling():
+    profile = OutputProfile(dpi=150)
+
+    encoded = profile.encode(make_text_image(), dpi=300)
+    assert (encoded["width"], encoded["height"]) == (150, 200)
+    # Images of unknown or lower resolution are kept as they are
+    assert profile.encode(make_text_image())["width"] == 300
+    assert profile.encode(make_text_image(), dpi=100)["width"] == 300
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        OutputProfile.named("unknown")
+    with pytest.raises(ValueError):
+        OutputProfile(color_mode="sepia")
+    assert OutputProfile.named("compact", jpeg_quality=None, dpi=100).dpi == 100
+
+
+def test_bilevel_pages_render_black_on_white():
+    img = make_text_image()
+    image = Image(img)
+    image.set_orientation({"orientation": 0, "rotate": 0})
+    image.set_skew(0)
+    output = BytesIO()
+    PDFCorrector(output_profile=OutputProfile.named("bilevel")).correct_pdf(PDFFile([Page(1, 0, [image])]), output)
+
+    pdf = pdfium.PdfDocument(output.getvalue())
+    rendered = pdf[0].render(scale=1).to_numpy()
+    # Mostly white paper around the black text, not an inverted page
+    assert np.mean(rendered) > 200
+    assert np.count_nonzero(rendered[..., 0] < 64) > 0
+    pdf.close()
@@ -0,0 +1,209 @@
+from io import BytesIO
+import cv2
+import pytest
+import numpy as np
+import pypdfium2 as pdfium
+from PyPDF2 import PdfReader
+from reportlab.pdfgen import canvas
+from models.image import Image
+from models.page import Page
+from models.pdffile import PDFFile
+from models.stagetimer import StageTimer
+from services import jpegtran
+from services.pdf_corrector import PDFCorrector
+
+
+def make_source_pdf(page_count):
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=(300, 400))
+    for page_number in range(page_count):
+        c.drawString(50, 350, f"Page {page_number + 1}")
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def make_image(orientation, skew_angle):
+    image = Image(np.full((40, 30, 3), 255, dtype=np.uint8))
+    image.set_orientation({"orientation": orientation, "rotate": (360 - orientation) % 360})
+    image.set_skew(skew_angle)
+    return image
+
+
+def correct(pdf, corrector):
+    output = BytesIO()
+    corrector.correct_pdf(pdf, output)
+    return PdfReader(output)
+
+
+def test_rotate_pages_copies_source_page():
+    source = make_source_pdf(3)
+    pdf = PDFFile([
+        Page(1, 0, [make_image(90, 0)]),
+        Page(2, 0, [make_image(180, 2.5)]),
+        Page(3, 0, [make_image(270, 0.05)]),
+    ], source)
+    reader = correct(pdf, PDFCorrector(rotate_pages=True, skew_tolerance=0.1))
+
+    assert len(reader.pages) == 3
+    assert reader.pages[0].rotation == 270
+    assert "Page 1" in reader.pages[0].extract_text()
+    # Skewed pages are still rendered
+    assert "Page 2" not in reader.pages[1].extract_text()
+    assert reader.pages[2].rotation == 90
+    assert "Page 3" in reader.pages[2].extract_text()
+
+
+def test_rotate_pages_disabled():
+    source = make_source_pdf(1)
+    pdf = PDFFile([Page(1, 0, [make_image(90, 0)])], source)
+    reader = correct(pdf, PDFCorrector())
+
+    assert reader.pages[0].rotation == 0
+    assert "Page 1" not in reader.pages[0].extract_text()
+
+
+def test_vector_skew_transforms_source_page():
+    source = make_source_pdf(2)
+    pdf = PDFFile([
+        Page(1, 0, [make_image(0, 3.0)]),
+        Page(2, 0, [make_image(180, -2.0)]),
+    ], source)
+    reader = correct(pdf, PDFCorrector(vector_skew=True))
+
+    assert len(reader.pages) == 2
+    for page_number, page in enumerate(reader.pages, start=1):
+        assert f"Page {page_number}" in page.extract_text()
+        assert b" cm" in page.get_contents().get_data()
+        # The page grows to hold the rotated content
+        assert float(page.mediabox.width) > 300 and float(page.mediabox.height) > 400
+    assert reader.pages[0].rotation == 0
+    assert reader.pages[1].rotation == 180
+
+
+def test_vector_skewed_pages_render():
+    source = BytesIO()
+    c = canvas.Canvas(source, pagesize=(300, 400))
+    c.rect(50, 50, 200, 300, fill=1)
+    c.showPage()
+    c.save()
+    pdf = PDFFile([Page(1, 0, [make_image(0, 3.0)])], source.getvalue())
+    output = BytesIO()
+    PDFCorrector(vector_skew=True).correct_pdf(pdf, output)
+
+    page = pdfium.PdfDocument(output.getvalue())[0]
+    # pdfium only draws content streams stored as indirect objects
+    assert len(list(page.get_objects())) > 0
+    assert page.render().to_numpy().mean() < 250
+
+
+def test_direct_engine_embeds_images():
+    pdf = PDFFile([
+        Page(1, 0, [make_image(0, 0), make_image(90, 0)]),
+        Page(2, 0, [make_image(0, 4.0)]),
+    ])
+    reader = correct(pdf, PDFCorrector(engine="direct"))
+
+    assert len(reader.pages) == 3
+    for page in reader.pages:
+        xobjects = page["/Resources"]["/XObject"]
+        image = xobjects["/Im0"].get_object()
+        assert image["/Filter"] == "/DCTDecode"
+        assert b"/Im0 Do" in page.get_contents().get_data()
+    # The quarter turn swaps the image dimensions
+    assert reader.pages[1]["/Resources"]["/XObject"]["/Im0"].get_object()["/Width"] == 40
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        PDFCorrector(engine="unknown")
+
+
+def test_timer_records_correction_stages():
+    timer = StageTimer()
+    pdf = PDFFile([
+        Page(1, 0, [make_image(90, 0), make_image(0, 2.0)]),
+        Page(2, 0, [make_image(0, 0)]),
+    ])
+    correct(pdf, PDFCorrector(engine="direct", timer=timer))
+
+    assert timer.pages == 2
+    assert timer.image_pixels == [1200, 1200, 1200]
+    assert set(timer.durations) == {"correction", "writing"}
+    assert all(seconds > 0 for seconds in timer.durations.values())
+
+
+def make_jpeg_image(orientation, skew_angle, width=64, height=48):
+    raw_data = np.full((height, width, 3), 255, dtype=np.uint8)
+    raw_data[:8, :8] = 0
+    ok, stream = cv2.imencode(".jpg", raw_data)
+    image = Image(raw_data, stream=stream.tobytes())
+    image.set_orientation({"orientation": orientation, "rotate": (360 - orientation) % 360})
+    image.set_skew(skew_angle)
+    return image
+
+
+def embedded_image(page):
+    xobjects = page["/Resources"]["/XObject"]
+    return xobjects[next(iter(xobjects))].get_object()
+
+
+def test_jpeg_info():
+    image = make_jpeg_image(0, 0)
+    assert jpegtran.jpeg_info(image.stream) == (64, 48, 3)
+    assert jpegtran.jpeg_info(b"not a jpeg") is None
+
+
+def test_lossless_jpeg_embeds_upright_images_as_is():
+    upright, skewed = make_jpeg_image(0, 0.05), make_jpeg_image(0, 3.0)
+    reader = correct(PDFFile([Page(1, 0, [upright, skewed])]), PDFCorrector(lossless_jpeg=True))
+
+    assert embedded_image(reader.pages[0]).get_data() == upright.stream
+    assert embedded_image(reader.pages[1]).get_data() != skewed.stream
+
+
+@pytest.mark.skipif(not jpegtran.available(), reason="jpegtran is not installed")
+def test_lossless_jpeg_rotation():
+    image = make_jpeg_image(90, 0)
+    reader = correct(PDFFile([Page(1, 0, [image])]), PDFCorrector(lossless_jpeg=True))
+
+    embedded = embedded_image(reader.pages[0])
+    assert (embedded["/Width"], embedded["/Height"]) == (48, 64)
+    rotated = cv2.imdecode(np.frombuffer(embedded.get_data(), np.uint8), cv2.IMREAD_GRAYSCALE)
+    # The corner is turned counter-clockwise, from the top left to the bottom left
+    assert rotated[-4, 4] < 128 and rotated[4, 4] > 128
+
+
+def test_pass_through_copies_correct_pages():
+    source = make_source_pdf(3)
+    pdf = PDFFile([
+        Page(1, 0, [make_image(0, 0.05)]),
+        Page(2, 0, [make_image(90, 0)]),
+        Page(3, 0, [make_image(0, 0)]),
+    ], source)
+    corrector = PDFCorrector(pass_through=True)
+    reader = correct(pdf, corrector)
+
+    assert corrector.copied_pages == 2
+    assert "Page 1" in reader.pages[0].extract_text()
+    assert "Page 3" in reader.pages[2].extract_text()
+    # The page keeps its size instead of becoming A4
+    assert (float(reader.pages[0].mediabox.width), float(reader.pages[0].mediabox.height)) == (300, 400)
+    # Pages needing a rotation are still rendered, in order
+    assert "Page 2" not in reader.pages[1].extract_text()
+
+
+def test_shared_images_are_embedded_once():
+    image = make_image(90, 0)
+    pdf = PDFFile([Page(page_number, 0, [image]) for page_number in range(1, 4)])
+    reader = correct(pdf, PDFCorrector(engine="direct"))
+
+    assert len(reader.pages) == 3
+    references = {page["/Resources"]["/XObject"].raw_get("/Im0").idnum for page in reader.pages}
+    assert len(references) == 1
+
+    reader = correct(pdf, PDFCorrector(engine="reportlab"))
+    assert len(reader.pages) == 3
+    references = {reference.idnum for page in reader.pages
+                  for reference in page["/Resources"]["/XObject"].values()}
+    assert len(references) == 1
@@ -0,0 +1,208 @@
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+import json
+import cv2
+import numpy as np
+from PyPDF2 import PdfReader, PdfWriter
+from interfaces.orientationpredictor import OrientationPredictor
+from interfaces.pdffileloader import PDFFileLoader
+from interfaces.skewpredictor import SkewPredictor
+from models.image import Image
+from models.page import Page
+from models.pdffile import PDFFile
+from services.cascadeorientationpredictor import CascadeOrientationPredictor
+from services.pdf_corrector import PDFCorrector
+from services.pdfplumberloader import PDFPlumberLoader
+
+
+class FakeOrientationPredictor(OrientationPredictor):
+    def process(self, raw_img):
+        orientation = int(raw_img[0, 0]) % 4 * 90
+        return {"orientation": orientation, "rotate": (360 - orientation) % 360}
+
+
+class FakeSkewPredictor(SkewPredictor):
+    def process(self, raw_img):
+        return float(raw_img[0, 0]) / 10
+
+
+class CountingSkewPredictor(SkewPredictor):
+    def __init__(self):
+        self.calls = 0
+
+    def process(self, raw_img):
+        self.calls += 1
+        return 0.5
+
+
+class FakeLoader(PDFFileLoader):
+    def __init__(self, page_count):
+        super().__init__()
+        self.page_count = page_count
+        self.loaded = 0
+
+    def iter_pages(self, filename):
+        for page_number in range(1, self.page_count + 1):
+            self.loaded += 1
+            yield {"page_number": page_number, "rotation": 0, "images": [np.zeros((4, 4), dtype=np.uint8)]}
+
+    def process(self, filename):
+        return list(self.iter_pages(filename))
+
+
+def make_pdf(page_count, images_per_page=2):
+    pages = []
+    value = 0
+    for page_number in range(1, page_count + 1):
+        images = []
+        for _ in range(images_per_page):
+            images.append(Image(np.full((4, 4), value, dtype=np.uint8)))
+            value += 1
+        pages.append(Page(page_number, 0, images))
+    return PDFFile(pages)
+
+
+def assert_predictions(pdf):
+    for value, img in enumerate(pdf.images):
+        assert img.orientation == value % 4 * 90
+        assert img.skew_angle == value / 10
+
+
+def test_predict_sequential():
+    pdf = make_pdf(5)
+    pdf.predict_orientation(FakeOrientationPredictor())
+    pdf.predict_skew(FakeSkewPredictor())
+    assert_predictions(pdf)
+
+
+def test_predict_with_process_pool():
+    pdf = make_pdf(9)
+    with ProcessPoolExecutor(max_workers=3) as executor:
+        pdf.predict_orientation(FakeOrientationPredictor(), executor)
+        pdf.predict_skew(FakeSkewPredictor(), executor)
+    assert_predictions(pdf)
+
+
+def test_stream_loads_pages_lazily():
+    loader = FakeLoader(3)
+    pages = PDFFile.stream(b"", loader)
+    assert loader.loaded == 0
+    first = next(pages)
+    assert first.page_number == 1 and loader.loaded == 1
+    assert [page.page_number for page in pages] == [2, 3]
+
+
+def test_to_json_reports_every_image():
+    pdf = make_pdf(2)
+    pdf.predict(FakeOrientationPredictor(), FakeSkewPredictor())
+
+    result = json.loads(pdf.to_json())
+    assert [page["page_number"] for page in result] == [1, 2]
+    assert result[1]["skew_angles"] == [0.2, 0.3]
+    assert result[1]["images"][1] == {
+        "orientation": 270, "rotate": 90, "orientation_confidence": None, "skew_angle": 0.3,
+    }
+
+
+class CountingOrientationPredictor(OrientationPredictor):
+    def __init__(self, orientation=90, confidence=5.0):
+        self.orientation = orientation
+        self.confidence = confidence
+        self.calls = 0
+
+    def process(self, raw_img):
+        self.calls += 1
+        return {"orientation": self.orientation, "rotate": (360 - self.orientation) % 360,
+                "confidence": self.confidence}
+
+
+def test_sampled_orientation_is_applied_to_other_pages():
+    pdf = make_pdf(20, images_per_page=1)
+    predictor = CountingOrientationPredictor()
+
+    assert pdf.predict(predictor, FakeSkewPredictor(), orientation_samples=3, sample_confidence=2.0) == 90
+    assert predictor.calls == 3
+    assert all(img.orientation == 90 and img.rotate == 270 for img in pdf.images)
+    # The skew is still predicted on every page
+    assert [img.skew_angle for img in pdf.images] == [value / 10 for value in range(20)]
+
+
+def test_unsure_samples_predict_every_page():
+    pdf = make_pdf(20, images_per_page=1)
+    predictor = CountingOrientationPredictor(confidence=1.0)
+
+    assert pdf.predict(predictor, FakeSkewPredictor(), orientation_samples=3, sample_confidence=2.0) is None
+    assert predictor.calls == 20
+
+    pdf = make_pdf(20, images_per_page=1)
+    assert pdf.predict(FakeOrientationPredictor(), FakeSkewPredictor(), orientation_samples=3) is None
+    assert_predictions(pdf)
+
+
+class SharedImageLoader(FakeLoader):
+    def iter_pages(self, filename):
+        letterhead = np.full((4, 4), 1, dtype=np.uint8)
+        for page_number in range(1, self.page_count + 1):
+            yield {"page_number": page_number, "rotation": 0, "images": [letterhead]}
+
+
+def test_shared_images_are_predicted_once():
+    pdf = PDFFile.of(b"", SharedImageLoader(4))
+    predictor = CountingOrientationPredictor()
+    pdf.predict(predictor, FakeSkewPredictor())
+
+    assert len(pdf.images) == 1
+    assert predictor.calls == 1
+    assert all(page.images[0].orientation == 90 for page in pdf.pages)
+
+
+def test_samples_decided_by_the_cascade_are_confident():
+    pdf = make_pdf(20, images_per_page=1)
+    fallback = CountingOrientationPredictor(orientation=180, confidence=12.5)
+    cascade = CascadeOrientationPredictor(CountingOrientationPredictor(confidence=0.8), fallback, threshold=0.5)
+
+    # The confidence of the first stage is below the threshold of the engine, on another scale
+    assert pdf.predict(cascade, FakeSkewPredictor(), orientation_samples=3, sample_confidence=2.0) == 90
+    assert cascade.decided == 3 and fallback.calls == 0
+
+
+def test_images_shared_with_samples_keep_their_prediction():
+    pdf = PDFFile.of(b"", SharedImageLoader(10))
+    predictor = CountingOrientationPredictor()
+    skew_predictor = CountingSkewPredictor()
+
+    assert pdf.predict(predictor, skew_predictor, orientation_samples=2, sample_confidence=2.0) == 90
+    assert predictor.calls == 1 and skew_predictor.calls == 1
+    assert pdf.images[0].orientation_confidence == 5.0
+
+
+def make_truncated_jpeg_pdf():
+    """A two pages PDF whose second image has its JPEG stream cut in half"""
+    writer = PdfWriter()
+    for truncated in (False, True):
+        img = np.full((400, 300, 3), 255, dtype=np.uint8)
+        img[100:110, 50:250] = 0
+        stream = cv2.imencode(".jpg", img)[1].tobytes()
+        PDFCorrector()._add_encoded_page(writer, {
+            "data": stream[:len(stream) // 2] if truncated else stream, "width": 300, "height": 400,
+            "color_space": "/DeviceRGB", "bits_per_component": 8, "filter": "/DCTDecode", "decode_parms": None,
+        })
+    output = BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def test_corrupt_lazy_images_are_skipped(caplog):
+    pdf_data = make_truncated_jpeg_pdf()
+    pdf = PDFFile.ofBytes(pdf_data, PDFPlumberLoader(decode_policy="keep"))
+    assert len(pdf.images) == 2
+
+    skew_predictor = CountingSkewPredictor()
+    pdf.predict(CountingOrientationPredictor(), skew_predictor)
+    assert [img.orientation for img in pdf.images] == [90, 0]
+    assert [img.skew_angle for img in pdf.images] == [0.5, 0] and skew_predictor.calls == 1
+
+    output = BytesIO()
+    PDFCorrector(engine="direct").correct_pdf(pdf, output)
+    assert len(PdfReader(output).pages) == 1
+    assert [record.name for record in caplog.records] == ["models.image", "services.pdf_corrector"]
@@ -0,0 +1,88 @@
+from io import BytesIO
+import numpy as np
+import pytest
+from PIL import Image as PILImage
+from reportlab.pdfgen import canvas
+from benchmarks.synthetic import generate_pdf, random_specs
+from models.image import Image
+from models.page import Page
+from models.pdffile import PDFFile
+from services.pdf_corrector import PDFCorrector
+from services.pdfiumloader import PDFiumLoader
+from services.pdfplumberloader import PDFPlumberLoader
+
+
+def make_bilevel_pdf():
+    img = np.full((200, 150), 255, dtype=np.uint8)
+    img[50:60, 20:130] = 0
+    buffer = BytesIO()
+    # Bilevel images are stored with the CCITT fax filter
+    PILImage.fromarray(img).convert("1").save(buffer, "PDF", resolution=100)
+    return buffer.getvalue()
+
+
+def test_matches_pdfplumber_on_jpeg_scans():
+    pdf_data = generate_pdf(random_specs(3, seed=2), dpi=100)
+    expected = PDFPlumberLoader().processBytes(pdf_data)
+    pages = PDFiumLoader().processBytes(pdf_data)
+
+    assert [page["page_number"] for page in pages] == [page["page_number"] for page in expected]
+    for page, expected_page in zip(pages, expected):
+        image, expected_image = page["images"][0], expected_page["images"][0]
+        assert image["stream"] == expected_image["stream"]
+        assert np.array_equal(image["raw_data"], expected_image["raw_data"])
+        assert round(image["dpi"]) == 100
+
+
+def test_decodes_ccitt_scans():
+    pages = PDFiumLoader().processBytes(make_bilevel_pdf())
+
+    image = pages[0]["images"][0]
+    assert image["raw_data"].shape == (200, 150, 3)
+    assert image["raw_data"][55, 75].tolist() == [0, 0, 0]
+    assert image["raw_data"][10, 10].tolist() == [255, 255, 255]
+    assert round(image["dpi"]) == 100
+
+
+def test_no_images():
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer)
+    c.drawString(50, 50, "No scan here")
+    c.save()
+    with pytest.raises(ValueError):
+        PDFiumLoader().processBytes(buffer.getvalue())
+
+
+def test_lazy_decode_policies():
+    pdf_data = generate_pdf(random_specs(2, seed=3), dpi=100)
+    for loader_class in (PDFPlumberLoader, PDFiumLoader):
+        pages = loader_class(decode_policy="drop").processBytes(pdf_data)
+        image = pages[0]["images"][0]
+        assert "raw_data" not in image
+        assert image["keep_decoded"] is False
+        assert image["size"][0] > 0
+
+    with pytest.raises(ValueError):
+        PDFiumLoader(decode_policy="unknown")
+
+
+def make_letterhead_pdf(page_count):
+    img = np.full((120, 90, 3), 255, dtype=np.uint8)
+    img[10:20, 10:80] = 0
+    letterhead = Image(img)
+    # The direct engine embeds the image drawn on every page as a single JPEG XObject
+    output = BytesIO()
+    PDFCorrector(engine="direct").correct_pdf(
+        PDFFile([Page(page_number, 0, [letterhead]) for page_number in range(1, page_count + 1)]), output
+    )
+    return output.getvalue()
+
+
+def test_shared_images_are_described_once():
+    pdf_data = make_letterhead_pdf(3)
+    for loader_class in (PDFPlumberLoader, PDFiumLoader):
+        pages = loader_class().processBytes(pdf_data)
+        assert pages[0]["images"][0] is pages[2]["images"][0]
+
+        pages = loader_class(share_images=False).processBytes(pdf_data)
+        assert pages[0]["images"][0] is not pages[2]["images"][0]
@@ -0,0 +1,36 @@
+import json
+import logging
+import pytest
+from benchmarks.synthetic import generate_pdf, random_specs
+from interfaces.orientationpredictor import OrientationPredictor
+import pipeline
+from pipeline import CorrectionPipeline
+
+
+class UprightOrientationPredictor(OrientationPredictor):
+    def process(self, raw_img):
+        return {"orientation": 0, "rotate": 0, "confidence": 10.0}
+
+
+@pytest.fixture
+def correction_pipeline(monkeypatch):
+    # Tesseract is not needed to exercise the pipeline
+    monkeypatch.setattr(CorrectionPipeline, "_orientation_predictor", lambda self: UprightOrientationPredictor())
+    return CorrectionPipeline(logging.getLogger(__name__))
+
+
+def test_analysis_counts_pages_and_pixels(correction_pipeline):
+    pdf_data = generate_pdf(random_specs(3, seed=1), dpi=50)
+    result, timer = correction_pipeline.analyze(pdf_data)
+
+    assert len(json.loads(result)) == 3
+    assert timer.pages == 3
+    assert len(timer.image_pixels) == 3 and all(pixels > 0 for pixels in timer.image_pixels)
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_invalid_documents_raise_a_validation_error(correction_pipeline, monkeypatch, streaming):
+    monkeypatch.setattr(pipeline.correction_settings, "streaming", streaming)
+
+    with pytest.raises(ValueError, match="not a valid PDF"):
+        correction_pipeline.run(b"not a pdf")
@@ -0,0 +1,60 @@
+import numpy as np
+from interfaces.skewpredictor import SkewPredictor
+from models.image import Image, predict_skews
+from services.predictioncache import PredictionCache
+
+
+class CountingSkewPredictor(SkewPredictor):
+    def __init__(self):
+        self.calls = 0
+
+    def process(self, raw_img):
+        self.calls += 1
+        return 1.5
+
+
+def make_images(streams):
+    return [Image(np.zeros((1, 1), dtype=np.uint8), stream=stream) for stream in streams]
+
+
+def test_lru_eviction():
+    cache = PredictionCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats() == {"hits": 3, "misses": 1, "entries": 2}
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    PredictionCache(directory=str(tmp_path)).put("abcdef", {"orientation": 90, "rotate": 270})
+    cache = PredictionCache(directory=str(tmp_path))
+    assert cache.get("abcdef") == {"orientation": 90, "rotate": 270}
+    assert cache.hits == 1
+
+
+def test_repeated_images_skip_prediction():
+    cache = PredictionCache()
+    predictor = CountingSkewPredictor()
+    predict_skews(make_images([b"first", b"second"]), predictor, cache=cache)
+    assert predictor.calls == 2
+
+    images = make_images([b"second", b"first", b"third"])
+    predict_skews(images, predictor, cache=cache)
+    assert predictor.calls == 3
+    assert [img.skew_angle for img in images] == [1.5, 1.5, 1.5]
+    assert cache.hits == 2
+
+
+def test_resolutions_are_part_of_the_key():
+    def scan(dpi):
+        return Image(np.zeros((1, 1), dtype=np.uint8), stream=b"scan", dpi=dpi)
+
+    predictor, other = CountingSkewPredictor(), CountingSkewPredictor()
+    predictor.analysis_dpi, other.analysis_dpi = 150, 200
+
+    assert scan(300).cache_key(predictor) == scan(300).cache_key(predictor)
+    assert scan(300).cache_key(predictor) != scan(100).cache_key(predictor)
+    assert scan(300).cache_key(predictor) != scan(300).cache_key(other)
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+from benchmarks.synthetic import make_page
+from models.imageanalysis import ImageAnalysis
+from services.projectionskewpredictor import ProjectionSkewPredictor
+
+
+@pytest.mark.parametrize("skew_angle", [-4.3, 0.0, 2.6])
+def test_predicts_skew(skew_angle):
+    img = make_page(0, skew_angle, dpi=150)
+    assert abs(ProjectionSkewPredictor().process(img) - skew_angle) < 0.15
+
+
+def test_blank_page():
+    assert ProjectionSkewPredictor().process(np.full((300, 200, 3), 255, dtype=np.uint8)) == 0
+
+
+def test_reduced_binary_is_shared():
+    analysis = ImageAnalysis(make_page(0, 1.0, dpi=150))
+    ProjectionSkewPredictor(size=500).process(analysis)
+
+    assert analysis.reduced_binary(500) is analysis.reduced_binary(500)
+    assert max(analysis.reduced_binary(500).shape) == 500
@@ -0,0 +1,15 @@
+from benchmarks.synthetic import generate_pdf, random_specs
+from models.pdffile import PDFFile
+from services.pdfplumberloader import PDFPlumberLoader
+
+
+def test_generated_pdf_matches_specs():
+    specs = random_specs(3, seed=1)
+    pdf = PDFFile.ofBytes(generate_pdf(specs, dpi=100), PDFPlumberLoader())
+
+    assert len(pdf.pages) == 3
+    for page, (orientation, skew_angle) in zip(pdf.pages, specs):
+        image = page.images[0]
+        height, width = image.raw_data.shape[:2]
+        assert (width > height) == (orientation in (90, 270))
+        assert round(image.dpi) == 100
@@ -0,0 +1,95 @@
+import importlib
+import sys
+import threading
+import time
+import types
+import numpy as np
+import pytest
+
+
+class FakeEngine:
+    """Stands for tesserocr.PyTessBaseAPI, answering the OSD result of the fake module"""
+    created = []
+
+    def __init__(self, lang, psm):
+        self.lang = lang
+        self.psm = psm
+        self.images = 0
+        self.threads = set()
+        FakeEngine.created.append(self)
+
+    def SetImage(self, image):
+        self.images += 1
+        self.threads.add(threading.get_ident())
+        # Keeps the engine busy long enough for the calls to overlap
+        time.sleep(0.01)
+
+    def DetectOrientationScript(self):
+        return fake_tesserocr.osd_result
+
+    def Clear(self):
+        pass
+
+
+fake_tesserocr = types.SimpleNamespace(
+    PyTessBaseAPI=FakeEngine,
+    PSM=types.SimpleNamespace(OSD_ONLY=0),
+    osd_result={"orient_deg": 90, "orient_conf": 4.5},
+)
+
+
+@pytest.fixture
+def predictor_module(monkeypatch):
+    FakeEngine.created = []
+    fake_tesserocr.osd_result = {"orient_deg": 90, "orient_conf": 4.5}
+    monkeypatch.setitem(sys.modules, "tesserocr", fake_tesserocr)
+    module = importlib.reload(importlib.import_module("services.tesserocrorientationpredictor"))
+    yield module
+    # The module is imported again with the tesserocr package of the environment, if any
+    monkeypatch.undo()
+    importlib.reload(module)
+
+
+def page():
+    img = np.full((100, 80), 255, dtype=np.uint8)
+    img[20:80:10, 10:70] = 0
+    return img
+
+
+@pytest.mark.parametrize("orient_deg, rotate", [(0, 0), (90, 270), (180, 180), (270, 90)])
+def test_orientation_is_mapped_to_rotation(predictor_module, orient_deg, rotate):
+    fake_tesserocr.osd_result = {"orient_deg": orient_deg, "orient_conf": 3.2}
+    result = predictor_module.TesserocrOrientationPredictor(pool_size=1).process(page())
+
+    assert result == {"orientation": orient_deg, "rotate": rotate, "confidence": 3.2}
+
+
+def test_engines_are_reused_across_calls_and_threads(predictor_module):
+    predictor = predictor_module.TesserocrOrientationPredictor(pool_size=2)
+    predictor.process_batch([page() for _ in range(10)])
+    # Another instance with the same configuration shares the warm engines
+    predictor_module.TesserocrOrientationPredictor(pool_size=2).process(page())
+
+    assert len(FakeEngine.created) == 2
+    assert sum(engine.images for engine in FakeEngine.created) == 11
+    assert all(engine.lang == "osd" and engine.psm == fake_tesserocr.PSM.OSD_ONLY for engine in FakeEngine.created)
+    assert len(set().union(*(engine.threads for engine in FakeEngine.created))) > 1
+
+
+@pytest.mark.parametrize("pool_size, engines", [(0, 1), (1, 1), (3, 3)])
+def test_pool_size_is_honoured(predictor_module, pool_size, engines):
+    predictor_module.TesserocrOrientationPredictor(pool_size=pool_size).process(page())
+
+    assert len(FakeEngine.created) == engines
+
+
+def test_failed_detection_raises(predictor_module):
+    fake_tesserocr.osd_result = None
+    predictor = predictor_module.TesserocrOrientationPredictor(pool_size=1)
+
+    with pytest.raises(ValueError, match="could not detect"):
+        predictor.process(page())
+    # The engine is given back to the pool despite the failure
+    fake_tesserocr.osd_result = {"orient_deg": 0, "orient_conf": 1.0}
+    assert predictor.process(page())["rotate"] == 0
+    assert len(FakeEngine.created) == 1
@@ -0,0 +1,66 @@
+import threading
+import numpy as np
+from interfaces.orientationpredictor import OrientationPredictor
+from models.imageanalysis import ImageAnalysis
+from services.tiledorientationpredictor import TiledOrientationPredictor
+
+
+class FakeEngine(OrientationPredictor):
+    """Predicts 90 on tiles whose first pixel is dark, 0 otherwise, and fails on blank images"""
+
+    def __init__(self, confidence=3.0):
+        self.confidence = confidence
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def process(self, raw_img):
+        with self.lock:
+            self.calls += 1
+        if raw_img.min() == 255:
+            raise RuntimeError("Too few characters")
+        orientation = 90 if raw_img[0, 0] < 128 else 0
+        return {"orientation": orientation, "rotate": (360 - orientation) % 360, "confidence": self.confidence}
+
+
+def make_scan(tile_marks, tile_size=100):
+    """A grid of text-like tiles, each one starting with a dark pixel when its mark is True"""
+    rows, columns = tile_marks.shape
+    img = np.full((rows * tile_size, columns * tile_size), 255, dtype=np.uint8)
+    for row in range(rows):
+        for column in range(columns):
+            tile = img[row * tile_size:(row + 1) * tile_size, column * tile_size:(column + 1) * tile_size]
+            tile[10:90:10, 10:90] = 0
+            tile[0, 0] = 0 if tile_marks[row, column] else 255
+    return img
+
+
+def test_tiles_vote_on_the_orientation():
+    engine = FakeEngine()
+    marks = np.array([[True, True, False], [True, False, True]])
+    result = TiledOrientationPredictor(engine, max_tiles=5, tile_size=100).process(make_scan(marks))
+
+    assert result["orientation"] == 90 and result["rotate"] == 270
+    # Only the 5 densest of the 6 tiles are run
+    assert engine.calls <= 5
+    assert 0 < result["confidence"] <= 3.0
+
+
+def test_tiles_follow_ink_density():
+    img = make_scan(np.zeros((2, 2), dtype=bool))
+    img[:100, 100:] = 255
+    img[100:, :100] = 0
+    tiles = TiledOrientationPredictor(FakeEngine(), max_tiles=4, tile_size=100).tiles(ImageAnalysis(img))
+
+    # The blank tile and the fully inked one are skipped
+    assert sorted(tiles) == [(0, 100, 0, 100), (100, 200, 100, 200)]
+
+
+def test_sparse_images_are_sent_whole():
+    engine = FakeEngine()
+    img = np.full((300, 300), 255, dtype=np.uint8)
+    img[150:160, 100:200] = 0
+    img[0, 0] = 0
+
+    result = TiledOrientationPredictor(engine, tile_size=100).process(img)
+    assert result["orientation"] == 90
+    assert engine.calls == 1